@@ -0,0 +1,298 @@
+"""
+This module is a part of CSVEdit.
+It contains a "Patch" class that applies changes to a csv file
+while streaming it, and functions that run a list of operations
+from a file without the editor.
+"""
+import io
+import os
+import csv
+import time
+import shlex
+from itertools import chain, islice, repeat
+import tables
+
+# Number of rows that are copied at once
+# Default: 4096
+batch_size = 4096
+
+# Arguments taken by the operations of a batch,
+# the "stop" row of "fill" can be "end" to fill the rest of the column
+OPERATIONS = {"set_cell" : ("column", "row", "value"),
+              "fill" : ("column", "row", "stop", "value"),
+              "insert_row" : ("row",),
+              "insert_rows" : ("row", "count"),
+              "insert_column" : ("column",),
+              "remove_row" : ("row",),
+              "remove_rows" : ("row", "row"),
+              "remove_column" : ("column",)}
+
+def split_segment(segment: list, size: int):
+    """Splits a segment of rows or columns in two, the first one holding [size] of them"""
+    first, count, *cells = segment
+    head = [first, size, *cells]
+    tail = [first + size if first is not None else None,
+            count - size if count is not None else None,
+            *map(dict, cells)]
+    return [head, tail]
+
+def find_boundary(segments: list, position: int):
+    """
+    Returns the index of the segment that starts at a given position,
+    splitting the segment that holds it when needed
+    """
+    if position < 0:
+        raise IndexError(f"Position {position + 1} is out of range")
+    start = 0
+    for index, segment in enumerate(segments):
+        if start == position:
+            return index
+        count = segment[1]
+        if count is None or position < start + count:
+            segments[index:index + 1] = split_segment(segment, position - start)
+            return index + 1
+        start += count
+    return len(segments)
+
+class Patch:
+    """
+    Changes made to a csv file that are applied while it is copied.
+    The rows of the result are kept as segments of consecutive rows
+    of the file or of new rows, with the values that were set in them,
+    so the changes take no memory per row and the file is read only once.
+    The last segment holds the rest of the file, however long it is.
+    Columns are kept the same way, and new columns get negative numbers.
+    """
+    def __init__(self, file_name: str):
+        # Creates a patch that leaves the file as it is
+        self.file_name = file_name
+        with open(file_name, encoding="utf-8") as file:
+            self.dialect = tables.sniff_dialect(file)
+        self.rows = [[0, None, {}]]
+        self.columns = [[0, None]]
+        self.new_columns = 0
+        self.rows_read = 0
+        self.rows_written = 0
+
+    def get_column_id(self, column):
+        """Returns the number of the file column shown at a given position"""
+        index = find_boundary(self.columns, tables.get_column_number(column) - 1)
+        find_boundary(self.columns, tables.get_column_number(column))
+        return self.columns[index][0]
+
+    def set_cell(self, column, row: int, value):
+        """Sets the value of a cell"""
+        self.fill(column, row, row + 1, value)
+
+    def fill(self, column, start: int, stop: int, value):
+        """
+        Sets the values of the cells in a column from [start] up to,
+        but not including, [stop], or up to the end if [stop] is None
+        """
+        column_id = self.get_column_id(column)
+        first = find_boundary(self.rows, start - 1)
+        last = len(self.rows) if stop is None else find_boundary(self.rows, stop - 1)
+        for segment in self.rows[first:last]:
+            segment[2][column_id] = value
+
+    def insert_row(self, row_index: int):
+        """Inserts an empty row at a given index"""
+        self.insert_rows(row_index, 1)
+
+    def insert_rows(self, row_index: int, count: int):
+        """Inserts [count] empty rows at a given index"""
+        self.rows.insert(find_boundary(self.rows, row_index), [None, count, {}])
+
+    def insert_column(self, column_index: int):
+        """Inserts an empty column at a given index"""
+        self.new_columns -= 1
+        self.columns.insert(find_boundary(self.columns, column_index), [self.new_columns, 1])
+
+    def remove_row(self, row_index: int):
+        """Removes a row at a given index"""
+        self.remove_rows(row_index, row_index + 1)
+
+    def remove_rows(self, start: int, stop: int):
+        """Removes the rows from [start] up to, but not including, [stop]"""
+        first = find_boundary(self.rows, start - 1)
+        del self.rows[first:find_boundary(self.rows, stop - 1)]
+
+    def remove_column(self, column_index: int):
+        """Removes a column at a given index"""
+        first = find_boundary(self.columns, column_index - 1)
+        del self.columns[first:find_boundary(self.columns, column_index)]
+
+    def column_plan(self):
+        """
+        Returns a function that rearranges the values of a row of the file
+        into the columns of the result (or None if they are not changed),
+        and a function that returns the positions of the values set in a segment
+        """
+        shown = []
+        for first, count in self.columns[:-1]:
+            shown.extend(range(first, first + count))
+        rest = self.columns[-1][0]
+        positions = {column_id: position for position, column_id in enumerate(shown)}
+
+        def get_updates(cells: dict):
+            updates = []
+            for column_id, value in cells.items():
+                if column_id in positions:
+                    updates.append((positions[column_id], value))
+                elif column_id >= rest:
+                    updates.append((len(shown) + column_id - rest, value))
+            return updates
+
+        if shown == list(range(rest)):
+            return None, get_updates
+        # New columns take the last value of the padding, which is always empty
+        indices = [column_id if column_id >= 0 else -1 for column_id in shown]
+        padding = [None] * (max(shown + [0]) + 2)
+
+        def map_row(row: list):
+            extended = row + padding
+            return list(map(extended.__getitem__, indices)) + row[rest:]
+
+        return map_row, get_updates
+
+    def write_rows(self, file):
+        """
+        Writes the changed rows of the file as csv to an open binary file.
+        When the columns were not changed, the rows that were not changed
+        are copied as they were read, keeping their quoting and line breaks,
+        only the changed and new rows are written by the csv writer.
+        """
+        text_file = io.TextIOWrapper(file, encoding="utf-8", newline="")
+        writer = csv.writer(text_file, dialect=self.dialect)
+        map_row, get_updates = self.column_plan()
+        self.rows_read = self.rows_written = 0
+        line_break = True
+
+        def write(rows):
+            # Writes rows with the csv writer
+            nonlocal line_break
+            if not line_break:
+                text_file.write(self.dialect.lineterminator)
+            writer.writerows(rows)
+            line_break = True
+
+        with open(self.file_name, encoding="utf-8", newline="") as source:
+            # Lines of the file that were parsed but not written yet
+            lines = []
+
+            def read_lines():
+                for line in source:
+                    lines.append(line)
+                    yield line
+
+            reader = csv.reader(read_lines(), self.dialect)
+            # New rows are as wide as the first row of the result
+            header = next(reader, None)
+            width = 0
+            if header is not None:
+                reader = chain([header], reader)
+                width = len(map_row(header) if map_row else header)
+
+            # Position of the first row of a segment in the result
+            position = 0
+            for first, count, cells in self.rows:
+                start = position
+                if count is not None:
+                    position += count
+                updates = get_updates(cells)
+                if first is None:
+                    row = [None] * width
+                    for position, value in updates:
+                        set_value(row, position, value)
+                    write(repeat(row, count))
+                    self.rows_written += count
+                    continue
+
+                # Rows before the segment were removed
+                skipped = sum(1 for _ in islice(reader, first - self.rows_read))
+                if skipped:
+                    self.rows_read += skipped
+                    lines.clear()
+                remaining = count
+                while remaining is None or remaining > 0:
+                    size = batch_size if remaining is None else min(remaining, batch_size)
+                    batch = list(islice(reader, size))
+                    if not batch:
+                        break
+                    self.rows_read += len(batch)
+                    self.rows_written += len(batch)
+                    if remaining is not None:
+                        remaining -= len(batch)
+                    if map_row or updates:
+                        if map_row:
+                            batch = list(map(map_row, batch))
+                        for position, value in updates:
+                            for row in batch:
+                                set_value(row, position, value)
+                        write(batch)
+                    else:
+                        if not line_break:
+                            text_file.write(self.dialect.lineterminator)
+                        text_file.write("".join(lines))
+                        # Only the last line of the file can end without a line break
+                        line_break = lines[-1].endswith(("\n", "\r"))
+                    lines.clear()
+                if remaining and updates:
+                    raise IndexError(f"Row {start + count - remaining + 1} is out of range")
+
+        text_file.flush()
+        text_file.detach()
+
+def set_value(row: list, position: int, value):
+    """Sets a value in a row, adding empty values to it when it is too short"""
+    if position >= len(row):
+        row.extend([None] * (position + 1 - len(row)))
+    row[position] = value
+
+def parse_argument(kind: str, text: str):
+    """Converts the text of an argument of an operation to its value"""
+    match kind:
+        case "column" if text.isalpha():
+            return tables.get_column_number(text)
+        case "stop" if text == "end":
+            return None
+        case "column" | "row" | "stop" | "count" if int(text) < 0:
+            raise ValueError(f"Negative {kind}: {text}")
+        case "column" | "row" | "stop" | "count":
+            return int(text)
+    return text or None
+
+def read_operations(file_name: str):
+    """Returns the operations listed in a file, one per line, with their line numbers"""
+    operations = []
+    with open(file_name, encoding="utf-8") as file:
+        for line_number, line in enumerate(file, 1):
+            words = shlex.split(line, comments=True)
+            if not words:
+                continue
+            name, *arguments = words
+            if name not in OPERATIONS or len(arguments) != len(OPERATIONS[name]):
+                raise ValueError(f"Invalid operation on line {line_number}: '{line.strip()}'")
+            try:
+                arguments = list(map(parse_argument, OPERATIONS[name], arguments))
+            except ValueError:
+                raise ValueError(f"Invalid argument on line {line_number}: '{line.strip()}'") from None
+            operations.append((line_number, name, arguments))
+    return operations
+
+def run(operations_file: str, input_file: str, output_file: str):
+    """Applies the operations listed in a file to a csv file and reports the time they took"""
+    operations = read_operations(operations_file)
+    patch = Patch(input_file)
+    for line_number, name, arguments in operations:
+        start = time.perf_counter()
+        getattr(patch, name)(*arguments)
+        elapsed = time.perf_counter() - start
+        print(f"{line_number:>6}  {name:<14} {elapsed * 1000:10.3f} ms")
+
+    start = time.perf_counter()
+    tables.file_save(patch, output_file)
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    size = os.path.getsize(input_file) / 2 ** 20
+    print(f"Read {patch.rows_read} rows ({size:.1f} MB) and wrote {patch.rows_written} rows "
+          f"in {elapsed:.2f} s, {patch.rows_read / elapsed:.0f} rows/s, {size / elapsed:.1f} MB/s")
@@ -0,0 +1,602 @@
+#!/usr/bin/python3
+"""
+This module is a part of CSVEdit.
+It contains benchmarks that measure the time and memory
+used by the parts of the editor.
+"""
+import sys
+import time
+import json
+import random
+import argparse
+import platform
+import tracemalloc
+
+import csv
+import os
+import pty
+import curses
+import select
+import tempfile
+import subprocess
+
+import tables
+import lazytables
+import sorting
+import history
+import interface
+import visuals
+import renderer
+from quotesniff import sniff_quoting
+from storage import Column
+
+# Shapes of the tables generated for the suite, as their numbers of columns
+SHAPES = {"narrow": 8, "wide": 32}
+
+# Numbers of rows of the tables generated for the suite
+SUITE_ROWS = [1000, 100000, 1000000]
+
+# Number of rows the other benchmarks use when none are given
+DEFAULT_ROWS = 500000
+
+# Number of times each structural edit of the suite is repeated
+EDIT_COUNT = 100
+
+# Height and width of the fake screen the editor is drawn on
+SCREEN_SIZE = (50, 200)
+
+# Width that the cells are cut to on the fake screen
+MAX_CELL_LENGTH = 28
+
+# Number of screens of the table laid out while composing frames is timed
+COMPOSE_COUNT = 200
+
+# Number of screens of the table that are scrolled over again and again
+# while composing frames with a cache of the texts of the rows is timed
+CACHED_SCREENS = 10
+
+# Keys pressed in the editor while its frames are timed, with the names of the frames
+RENDER_KEYS = [("move down", curses.KEY_DOWN),
+               ("move right", curses.KEY_RIGHT),
+               ("page down", visuals.KEY_PGDN.code),
+               ("end", curses.KEY_END),
+               ("redraw", visuals.KEY_F5.code)]
+
+# Number of times the editor is started while its start is timed
+# Default: 10
+startup_count = 10
+
+# Number of seconds the editor is given to draw its first frame
+STARTUP_TIMEOUT = 60
+
+# The editor that is started while its start is timed
+EDITOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "csvedit.py")
+
+# A timing is a regression when it is slower than the baseline by more than this fraction
+# Default: 0.2
+regression_threshold = 0.2
+
+# Timings shorter than this many seconds are too noisy to be compared with a baseline
+# Default: 0.01
+regression_floor = 0.01
+
+def timed(function, *args):
+    """Returns the result of a function call and its run time"""
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def traced(function, *args):
+    """
+    Returns the result of a function call,
+    the memory still held after it and its peak memory
+    """
+    tracemalloc.start()
+    result = function(*args)
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, held, peak
+
+def timed_calls(function, count: int, *args):
+    """Returns the run time of [count] calls of a function with the same arguments"""
+    start = time.perf_counter()
+    for _ in range(count):
+        function(*args)
+    return time.perf_counter() - start
+
+class FakeWindow:
+    """
+    A curses window or pad that keeps its lines in memory,
+    so the editor can be drawn without a terminal
+    """
+    def __init__(self, fake_curses, lines: int, columns: int):
+        self.fake_curses = fake_curses
+        self.size = (lines, columns)
+        self.lines = [" " * columns] * lines
+
+    def addstr(self, y: int, x: int, text: str, attribute: int = 0):
+        line = self.lines[y]
+        self.lines[y] = (line[:x] + text + line[x + len(text):])[:self.size[1]]
+
+    def insstr(self, y: int, x: int, text: str, attribute: int = 0):
+        self.addstr(y, x, text, attribute)
+
+    def erase(self):
+        self.lines = [" " * self.size[1]] * self.size[0]
+
+    def clear(self):
+        self.erase()
+
+    def getmaxyx(self):
+        return self.size
+
+    def getch(self):
+        return self.fake_curses.getch()
+
+    def keypad(self, flag: bool):
+        pass
+
+    def touchwin(self):
+        pass
+
+    def touchline(self, y: int, count: int):
+        pass
+
+    def noutrefresh(self, *args):
+        pass
+
+class FakeCurses:
+    """
+    Stands in for the curses module used by the interface: windows are kept
+    in memory and keys are read from a list, noting the time each one is read at.
+    The constants are the ones of the curses module.
+    """
+    def __init__(self, keys: list, lines: int, columns: int):
+        self.keys = list(keys)
+        self.key_times = []
+        self.screen = FakeWindow(self, lines, columns)
+
+    def __getattr__(self, name: str):
+        return getattr(curses, name)
+
+    def newwin(self, lines: int, columns: int, *position):
+        return FakeWindow(self, lines, columns)
+
+    def newpad(self, lines: int, columns: int):
+        return FakeWindow(self, lines, columns)
+
+    def getch(self):
+        # The editor quits once all the keys were pressed
+        self.key_times.append(time.perf_counter())
+        return self.keys.pop(0) if self.keys else visuals.KEY_Q.code
+
+    def doupdate(self):
+        pass
+
+    def curs_set(self, visibility: int):
+        pass
+
+    def halfdelay(self, tenths: int):
+        pass
+
+def time_frames(table, keys: list):
+    """
+    Returns the time the editor takes to draw a table the first time
+    and after each of given keys, drawing it on a fake screen
+    """
+    fake_curses = FakeCurses(keys, *SCREEN_SIZE)
+    key_hint = dict.fromkeys(("edit", "confirm", "quit", "cancel", "update"), "")
+    editor = interface.Editor(key_hint=key_hint,
+                              max_cell_len=MAX_CELL_LENGTH,
+                              table=table,
+                              absolute_path="",
+                              read_only=False,
+                              new_file=False,
+                              key_bind_table=None,
+                              history=history.History())
+    real_curses = interface.curses
+    interface.curses = fake_curses
+    try:
+        start = time.perf_counter()
+        editor.edit(fake_curses.screen)
+    finally:
+        interface.curses = real_curses
+    times = [start, *fake_curses.key_times]
+    return [stop - start for start, stop in zip(times, times[1:])]
+
+def time_composition(table, count: int = COMPOSE_COUNT, cache: renderer.CellCache = None,
+                     screens: int = None):
+    """
+    Returns the time taken to lay out the column names, the row numbers
+    and the cells of [count] screens of a table in frames, without curses,
+    scrolling a screen further down each time, and back to the top
+    after [screens] screens when it is given
+    """
+    frame = renderer.Frame(*SCREEN_SIZE)
+    row_width = len(str(table.row_count))
+    columns = renderer.visible_columns(table, 0, row_width, frame.width, MAX_CELL_LENGTH)
+    height = renderer.table_height(frame)
+    start = time.perf_counter()
+    for screen in range(count):
+        top = (screen % (screens or count)) * height % max(table.row_count, 1)
+        rows = range(top + 1, min(table.row_count, top + height) + 1)
+        renderer.draw_header(frame, columns, row_width, tables.get_column)
+        renderer.draw_row_numbers(frame, list(rows), row_width)
+        renderer.draw_table(frame, table, columns, rows, row_width, MAX_CELL_LENGTH,
+                            lambda column_number, row: renderer.NORMAL, cache)
+    return time.perf_counter() - start
+
+def time_startup(file_name: str, *options: str):
+    """
+    Returns the time from launching the editor on a file in a pseudo terminal
+    until it has drawn its first frame, which ends with the address of the pointer
+    """
+    start = time.perf_counter()
+    pid, descriptor = pty.fork()
+    if pid == 0:
+        # curses takes the size of the screen from the environment
+        os.environ.update(TERM=os.environ.get("TERM") or "xterm",
+                          LINES=str(SCREEN_SIZE[0]), COLUMNS=str(SCREEN_SIZE[1]))
+        os.execv(sys.executable, [sys.executable, EDITOR, file_name, *options])
+    output = b""
+    try:
+        while b"A:1" not in output:
+            if time.perf_counter() - start > STARTUP_TIMEOUT:
+                raise TimeoutError(f"The editor did not start in {STARTUP_TIMEOUT} seconds")
+            if select.select([descriptor], [], [], 0.1)[0]:
+                try:
+                    output += os.read(descriptor, 65536)
+                except OSError as error:
+                    raise RuntimeError(f"The editor exited before its first frame: {output[-200:]}") from error
+        elapsed = time.perf_counter() - start
+        os.write(descriptor, visuals.KEY_Q.text[1].encode())
+        # The output is read until the editor exits, so it is not blocked by a full terminal
+        while True:
+            try:
+                if not os.read(descriptor, 65536):
+                    break
+            except OSError:
+                break
+    finally:
+        os.close(descriptor)
+        os.waitpid(pid, 0)
+    return elapsed
+
+def sample_values(rows: int, seed: int = 0):
+    """Returns a list of short text values similar to the ones in exported tables"""
+    generator = random.Random(seed)
+    return [str(generator.randint(0, 10 ** generator.randint(1, 9))) for _ in range(rows)]
+
+def write_sample_file(file_name: str, rows: int, columns: int = 8, seed: int = 0):
+    """Writes a csv file with [rows] rows of mixed numeric and text values"""
+    generator = random.Random(seed)
+    with open(file_name, "w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file)
+        for row in range(rows):
+            writer.writerow([row if column == 0
+                             else generator.randint(0, 10 ** 6) if column % 3 == 1
+                             else f"text {generator.randint(0, 9999)}" if column % 3 == 2
+                             else "" for column in range(columns)])
+
+def legacy_file_open(file_name):
+    """
+    The reference loader that tables.file_open replaced:
+    sniffs the quoting from the whole file, counts the rows and
+    columns in one pass and fills the table in another one
+    """
+    with open(file_name, encoding="utf-8") as file:
+        dialect = csv.Sniffer().sniff(file.readline(), delimiters=tables.valid_delimeters)
+        dialect.quoting = sniff_quoting(file_name, dialect)
+        file.seek(0)
+        filereader = csv.reader(file, dialect)
+        max_rows = 0
+        max_columns = 0
+        for row in filereader:
+            max_columns = max(max_columns, len(row))
+            max_rows += 1
+        return_table = tables.Table(max_columns, max_rows)
+        return_table.dialect = dialect
+        file.seek(0)
+        for current_row, row in enumerate(filereader, 1):
+            for column, value in enumerate(row, 1):
+                return_table.set_cell(column, current_row, None if value == "" else value)
+    return return_table
+
+def legacy_file_save(table, file_name):
+    """
+    The reference writer that tables.file_save replaced:
+    looks up every cell up to three times and writes the rows one by one
+    """
+    with open(file_name, "w", encoding="utf-8") as file:
+        writer = csv.writer(file, dialect=table.dialect)
+        for row in range (1, table.row_count + 1):
+            row_out = []
+            for column in range (1, table.column_count + 1):
+                if table.get_cell(column, row) is None or table.get_cell(column, row) == 'None':
+                    row_out.append('')
+                else:
+                    row_out.append(table.get_cell(column, row))
+            writer.writerow(row_out)
+
+def bench_load(rows: int):
+    """Compares tables.file_open with the reference loader"""
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, "load.csv")
+        write_sample_file(file_name, rows)
+        size = os.path.getsize(file_name)
+        for name, loader in (("legacy", legacy_file_open), ("file_open", tables.file_open)):
+            _, elapsed = timed(loader, file_name)
+            _, _, peak = traced(loader, file_name)
+            results[name] = {"seconds": elapsed,
+                             "mb_per_second": size / elapsed / 2 ** 20,
+                             "peak_mb": peak / 2 ** 20}
+    return results
+
+def bench_save(rows: int):
+    """Compares tables.file_save with the reference writer"""
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, "save.csv")
+        write_sample_file(file_name, rows)
+        table = tables.file_open(file_name)
+        for name, writer in (("legacy", legacy_file_save), ("file_save", tables.file_save)):
+            _, elapsed = timed(writer, table, file_name)
+            size = os.path.getsize(file_name)
+            results[name] = {"seconds": elapsed,
+                             "mb_per_second": size / elapsed / 2 ** 20}
+
+        # A lazy table with a handful of changed cells copies the other rows
+        lazy_table = lazytables.file_open(file_name)
+        for row in range(1, rows + 1, max(rows // 10, 1)):
+            lazy_table.set_cell(2, row, "changed")
+        _, elapsed = timed(tables.file_save, lazy_table, os.path.join(directory, "copy.csv"))
+        results["incremental"] = {"seconds": elapsed,
+                                  "mb_per_second": size / elapsed / 2 ** 20}
+    return results
+
+def bench_parallel(rows: int):
+    """Compares tables.file_open parsing a file in 1, 2, 4 and 8 processes"""
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, "parallel.csv")
+        write_sample_file(file_name, rows)
+        size = os.path.getsize(file_name)
+        default_part_size = tables.part_size
+        # Every process gets a few parts, so they finish at about the same time
+        tables.part_size = max(size // 32, tables.sample_size)
+        try:
+            serial = None
+            for process_count in (1, 2, 4, 8):
+                table, elapsed = timed(tables.file_open, file_name, process_count)
+                rows_read = table.get_rows(1, table.row_count + 1)
+                if serial is None:
+                    serial = (rows_read, elapsed)
+                elif rows_read != serial[0]:
+                    raise AssertionError(f"{process_count} processes did not read the same rows")
+                results[f"{process_count} workers"] = {"seconds": elapsed,
+                                                       "mb_per_second": size / elapsed / 2 ** 20,
+                                                       "speedup": serial[1] / elapsed}
+        finally:
+            tables.part_size = default_part_size
+    return results
+
+def bench_sort(rows: int):
+    """Measures sorting a table by a numeric and a text column, in memory and in runs"""
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, "sort.csv")
+        write_sample_file(file_name, rows)
+        table = tables.file_open(file_name)
+        for name, column, descending in (("numbers", 2, False), ("numbers desc", 2, True),
+                                         ("text", 3, False)):
+            order, elapsed = timed(table.sort_rows, column, descending)
+            table.permute_rows(order)
+            results[name] = {"seconds": elapsed, "rows_per_second": rows / elapsed}
+
+        # Runs of a tenth of the rows are written to temporary files and merged
+        default_memory_limit = sorting.memory_limit
+        sorting.memory_limit = max(rows // 10, 1) * sorting.KEY_SIZE
+        try:
+            _, elapsed = timed(table.sort_rows, 2)
+            results["external"] = {"seconds": elapsed, "rows_per_second": rows / elapsed}
+            lazy_table = lazytables.file_open(file_name)
+            _, elapsed = timed(lazy_table.sort_rows, 2)
+            results["lazy"] = {"seconds": elapsed, "rows_per_second": rows / elapsed}
+        finally:
+            sorting.memory_limit = default_memory_limit
+        _, elapsed = timed(tables.file_save, lazy_table, os.path.join(directory, "sorted.csv"))
+        results["lazy save"] = {"seconds": elapsed, "rows_per_second": rows / elapsed}
+    return results
+
+def bench_storage(rows: int):
+    """Compares a column stored as a list of values with a storage.Column"""
+    text = "\n".join(sample_values(rows))
+    indices = list(range(rows))
+    random.Random(1).shuffle(indices)
+    results = {}
+
+    def build_list():
+        return text.split("\n")
+
+    def build_column():
+        column = Column()
+        column.extend(text.split("\n"))
+        return column
+
+    for name, build, get in (("list", build_list, list.__getitem__),
+                             ("column", build_column, Column.get)):
+        column, held, _ = traced(build)
+        start = time.perf_counter()
+        for index in indices:
+            get(column, index)
+        elapsed = time.perf_counter() - start
+        results[name] = {"bytes_per_cell": held / rows,
+                         "ns_per_get": elapsed / rows * 1e9}
+    return results
+
+def bench_suite(rows: int):
+    """
+    Measures loading, saving and editing narrow and wide tables,
+    drawing them in the editor and composing their frames
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for shape, columns in SHAPES.items():
+            file_name = os.path.join(directory, f"{shape}.csv")
+            write_sample_file(file_name, rows, columns)
+            size = os.path.getsize(file_name)
+            table, elapsed = timed(tables.file_open, file_name)
+            results[f"{shape} load"] = {"seconds": elapsed, "mb_per_second": size / elapsed / 2 ** 20}
+            _, elapsed = timed(tables.file_save, table, os.path.join(directory, "saved.csv"))
+            results[f"{shape} save"] = {"seconds": elapsed, "mb_per_second": size / elapsed / 2 ** 20}
+
+            # Edits are made in the middle of the table, where they move the most
+            generator = random.Random(0)
+            cells = [(generator.randint(1, columns), generator.randint(1, rows)) for _ in range(EDIT_COUNT)]
+            edits = [("set_cell", lambda: [table.set_cell(column, row, "changed") for column, row in cells], 1),
+                     ("insert_row", lambda: table.insert_row(rows // 2), EDIT_COUNT),
+                     ("remove_row", lambda: table.remove_row(rows // 2 + 1), EDIT_COUNT),
+                     ("insert_column", lambda: table.insert_column(columns // 2), EDIT_COUNT),
+                     ("remove_column", lambda: table.remove_column(columns // 2 + 1), EDIT_COUNT),
+                     ("max_len", lambda: [table.max_len(column) for column in range(1, columns + 1)], EDIT_COUNT)]
+            for name, edit, count in edits:
+                elapsed = timed_calls(edit, count)
+                results[f"{shape} {name}"] = {"seconds": elapsed, "us_per_edit": elapsed / EDIT_COUNT * 1e6}
+
+            frames = time_frames(table, [key for _, key in RENDER_KEYS])
+            for name, elapsed in zip(["first frame", *(name for name, _ in RENDER_KEYS)], frames):
+                results[f"{shape} {name}"] = {"seconds": elapsed, "frames_per_second": 1 / max(elapsed, 1e-9)}
+            elapsed = time_composition(table)
+            results[f"{shape} compose"] = {"seconds": elapsed, "ms_per_frame": elapsed / COMPOSE_COUNT * 1000}
+            # A cache that keeps no rows lays out every row it is asked for
+            elapsed = time_composition(table, COMPOSE_COUNT, renderer.CellCache(0))
+            results[f"{shape} compose missed"] = {"seconds": elapsed,
+                                                  "ms_per_frame": elapsed / COMPOSE_COUNT * 1000}
+            # The screens are scrolled over once to fill the cache
+            cache = renderer.CellCache()
+            time_composition(table, CACHED_SCREENS, cache)
+            elapsed = time_composition(table, COMPOSE_COUNT, cache, CACHED_SCREENS)
+            results[f"{shape} compose cached"] = {"seconds": elapsed,
+                                                  "ms_per_frame": elapsed / COMPOSE_COUNT * 1000}
+            table = None
+    return results
+
+def print_results(name: str, results: dict):
+    """Prints the results of a benchmark"""
+    print(f"[{name}]")
+    for variant, values in results.items():
+        line = ", ".join(f"{key}: {value:.4g}" for key, value in values.items())
+        print(f"  {variant:<20} {line}")
+
+def keep_fastest(results: dict, new_results: dict):
+    """Keeps the faster of the results of two runs of each variant of a benchmark"""
+    for variant, values in new_results.items():
+        old_values = results.get(variant)
+        if old_values is None or values.get("seconds", 0) < old_values.get("seconds", 0):
+            results[variant] = values
+
+def find_regressions(results: dict, baseline: dict):
+    """
+    Returns the benchmark, the variant and the old and new times
+    of the timings that got slower than in the results of an earlier run
+    """
+    regressions = []
+    for name, variants in results.items():
+        for variant, values in variants.items():
+            old = baseline.get(name, {}).get(variant, {}).get("seconds")
+            new = values.get("seconds")
+            if old is None or new is None or max(old, new) < regression_floor:
+                continue
+            if new > old * (1 + regression_threshold):
+                regressions.append((name, variant, old, new))
+    return regressions
+
+def bench_startup(rows: int):
+    """
+    Measures the time from launching the editor until its first frame,
+    and the time taken by launching python alone
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, "startup.csv")
+        write_sample_file(file_name, rows)
+        times = [timed(subprocess.run, [sys.executable, "-c", "pass"])[1] for _ in range(startup_count)]
+        results["python"] = {"seconds": min(times), "mean_seconds": sum(times) / len(times)}
+        for name, options in (("editor", []), ("lazy", ["--lazy"])):
+            times = [time_startup(file_name, *options) for _ in range(startup_count)]
+            results[name] = {"seconds": min(times), "mean_seconds": sum(times) / len(times)}
+    return results
+
+BENCHMARKS = {"storage": bench_storage,
+              "load": bench_load,
+              "save": bench_save,
+              "parallel": bench_parallel,
+              "sort": bench_sort,
+              "suite": bench_suite,
+              "startup": bench_startup}
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser()
+    argument_parser.add_argument("benchmarks",
+                                 help="names of the benchmarks to run (default: all)",
+                                 nargs="*"
+                                )
+    argument_parser.add_argument("-r", "--rows",
+                                 help=f"numbers of rows in the generated data (default: {DEFAULT_ROWS}, "
+                                      f"and {', '.join(map(str, SUITE_ROWS))} for the suite)",
+                                 type=int,
+                                 nargs="+"
+                                )
+    argument_parser.add_argument("-n", "--repeat",
+                                 help="run every benchmark this many times and keep the fastest times",
+                                 type=int,
+                                 default=1
+                                )
+    argument_parser.add_argument("-o", "--output",
+                                 help="write the results to a json file",
+                                 metavar="FILE",
+                                 type=str
+                                )
+    argument_parser.add_argument("-c", "--compare",
+                                 help="report the timings that got slower than in the json file of an earlier run",
+                                 metavar="FILE",
+                                 type=str
+                                )
+    argument_parser.add_argument("-t", "--threshold",
+                                 help=f"fraction a timing can grow by before it is reported (default: {regression_threshold})",
+                                 type=float
+                                )
+    arguments = argument_parser.parse_args()
+
+    for benchmark in arguments.benchmarks:
+        if benchmark not in BENCHMARKS:
+            print(f"[Error] No such benchmark: '{benchmark}'")
+            sys.exit(1)
+    if arguments.threshold is not None:
+        regression_threshold = arguments.threshold
+
+    all_results = {}
+    for benchmark in arguments.benchmarks or BENCHMARKS:
+        default_rows = SUITE_ROWS if benchmark == "suite" else [DEFAULT_ROWS]
+        for rows in arguments.rows or default_rows:
+            name = f"{benchmark} {rows}"
+            all_results[name] = {}
+            for _ in range(max(arguments.repeat, 1)):
+                keep_fastest(all_results[name], BENCHMARKS[benchmark](rows))
+            print_results(name, all_results[name])
+
+    if arguments.output:
+        with open(arguments.output, "w", encoding="utf-8") as file:
+            json.dump({"python": platform.python_version(),
+                       "platform": platform.platform(),
+                       "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                       "results": all_results}, file, indent=2)
+    if arguments.compare:
+        with open(arguments.compare, encoding="utf-8") as file:
+            regressions = find_regressions(all_results, json.load(file)["results"])
+        for name, variant, old, new in regressions:
+            print(f"[Regression] {name}, {variant}: {old:.4g} s -> {new:.4g} s ({new / old - 1:+.0%})")
+        if regressions:
+            sys.exit(3)
+    sys.exit(0)
@@ -3,6 +3,9 @@ import os
 import sys
 import argparse
 import interface
+import journal
+import batch
+import profiler
 
 from csvgen import generate_file
 
@@ -12,21 +15,73 @@ argument_parser.add_argument("file_name",
                              help="path to the file",
                              type=str
                             )
+argument_parser.add_argument("output_name",
+                             help="path to the file the result of a batch is written to, the file itself by default",
+                             type=str,
+                             nargs="?"
+                            )
 argument_parser.add_argument("-n", "--new",
                              help="create a new file instead of editing",
                              action="store_true"
                             )
+argument_parser.add_argument("-l", "--lazy",
+                             help="read the file on demand instead of loading all of it",
+                             action="store_true"
+                            )
+argument_parser.add_argument("-j", "--jobs",
+                             help="number of processes that parse a large file at once",
+                             type=int,
+                             default=1
+                            )
+argument_parser.add_argument("-b", "--batch",
+                             help="apply the operations listed in a file without opening the editor",
+                             metavar="OPERATIONS",
+                             type=str
+                            )
+
+argument_parser.add_argument("-p", "--profile",
+                             help="time the keys, the drawing and the reading and writing of the file, "
+                                  "and write the statistics to a file at exit, as json if its name ends with .json",
+                             metavar="FILE",
+                             type=str
+                            )
+argument_parser.add_argument("--overlay",
+                             help="show the time of the last frame and the 95th percentile of all of them",
+                             action="store_true"
+                            )
 
 arguments = argument_parser.parse_args()
 
+if arguments.batch:
+    output_name = arguments.output_name or arguments.file_name
+    try:
+        batch.run(arguments.batch, arguments.file_name, output_name)
+    except FileNotFoundError as error:
+        print(f"[Error] No such file: '{error.filename}'")
+        sys.exit(1)
+    except PermissionError as error:
+        print(f"[Error] Access denied: '{error.filename or output_name}'")
+        sys.exit(2)
+    except (ValueError, IndexError) as error:
+        print(f"[Error] {error}")
+        sys.exit(3)
+    sys.exit(0)
+
 parameters = {"filename" : arguments.file_name,
               "absolute_path" : os.path.abspath(arguments.file_name),
               "temp_file" : arguments.file_name + ".tmp",
+              "journal_file" : os.path.abspath(arguments.file_name) + ".journal",
+              "journal_interval" : 1.0,
+              "journal_changes" : None,
+              "undo_memory" : 128 * 2 ** 20,
               "new_file" : False,
+              "lazy" : arguments.lazy,
+              "workers" : arguments.jobs,
               "read_only" : not os.access(arguments.file_name, os.W_OK),
               "cell_size" : 28,
               "key_mappings" : None,
-              "key_bind_file" : "keybinds.csv"
+              "profiler" : profiler.Profiler(arguments.overlay) if arguments.profile or arguments.overlay else None,
+              "profile_file" : arguments.profile
              }
 
 if arguments.new and not os.path.isfile(arguments.file_name):
@@ -36,6 +91,16 @@ if arguments.new and not os.path.isfile(arguments.file_name):
     parameters["read_only"] = not os.access(parameters["temp_file"], os.W_OK)
 
 try:
+    if os.path.isfile(parameters["journal_file"]):
+        # The editor did not exit normally the last time
+        changes = journal.read_changes(parameters["journal_file"],
+                                       None if parameters["new_file"] else parameters["filename"])
+        if changes:
+            answer = input(f"Found {len(changes)} unsaved changes to '{arguments.file_name}'. "
+                           "Restore them? [y/n] ")
+            if answer.strip().lower() in ['yes', 'y']:
+                parameters["journal_changes"] = changes
+
     interface.start(**parameters)
 except FileNotFoundError:
     print(f"[Error] No such file: '{arguments.file_name}'")
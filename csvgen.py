@@ -1,10 +1,241 @@
+#!/usr/bin/python3
+"""
+This module is a part of CSVEdit.
+It contains functions that generate csv files, either filled with
+the same text or with random values of mixed kinds for testing.
+"""
+import io
+import os
+import csv
+import sys
+import time
+import random
+import argparse
 
-def generate_file(file_name: str, number_of_collumns: int = 2, number_of_rows: int = 2, cell_text: str = 'text'):
-    with open(file_name, 'w', encoding='utf-8') as file:
-        for y in range(number_of_rows):
-            for x in range(number_of_collumns):
-                file.write(cell_text)
-                if x < number_of_collumns - 1:
-                    file.write(',')
-            if y < number_of_rows - 1:
-                file.write('\n')
+import tables
+
+# Number of rows that are generated and written at once
+# Default: 8192
+batch_size = 8192
+
+# Number of different values every column takes its values from
+# Default: 16384
+pool_size = 16384
+
+# Ends the values of a pool while they are encoded, values can not contain it
+SEPARATOR = "\n\0"
+
+# Quoting styles that can be chosen by their names
+QUOTING_STYLES = {"minimal": csv.QUOTE_MINIMAL,
+                  "all": csv.QUOTE_ALL,
+                  "nonnumeric": csv.QUOTE_NONNUMERIC,
+                  "none": csv.QUOTE_NONE}
+
+# Words that free text is made of
+WORDS = ["alpha", "beta", "gamma", "delta", "north", "south", "east", "west",
+         "red", "green", "blue", "black", "small", "large", "new", "old",
+         "order", "item", "client", "account", "street", "city", "note", "value"]
+
+def random_int(generator: random.Random, delimiter: str):
+    """Returns an integer of up to 9 digits"""
+    return generator.choice((-1, 1)) * int(10 ** generator.uniform(0, 9))
+
+def random_float(generator: random.Random, delimiter: str):
+    """Returns a number with up to 6 decimal places"""
+    return round(generator.uniform(-1e6, 1e6), generator.randint(0, 6))
+
+def random_text(generator: random.Random, delimiter: str):
+    """Returns a few words"""
+    return " ".join(generator.choices(WORDS, k=generator.randint(1, 5)))
+
+def random_delimited(generator: random.Random, delimiter: str):
+    """Returns words with the delimiter between them, so the value has to be quoted"""
+    return f"{random_text(generator, delimiter)}{delimiter} {random_text(generator, delimiter)}"
+
+def random_quoted(generator: random.Random, delimiter: str):
+    """Returns words with some of them in quotes"""
+    return f'{random_text(generator, delimiter)} "{random_text(generator, delimiter)}"'
+
+def random_lines(generator: random.Random, delimiter: str):
+    """Returns words on two lines"""
+    return f"{random_text(generator, delimiter)}\n{random_text(generator, delimiter)}"
+
+# Functions that return a random value of each kind of column,
+# numbers are kept as numbers so "nonnumeric" quoting leaves them unquoted,
+# and "id" columns hold the numbers of the rows
+VALUE_KINDS = {"int": random_int,
+               "float": random_float,
+               "text": random_text,
+               "delimiter": random_delimited,
+               "quote": random_quoted,
+               "newline": random_lines}
+
+# Kinds of the columns when none are given, the row number comes first
+# Default: ["id", "int", "float", "text", "delimiter", "quote", "newline"]
+default_kinds = ["id", "int", "float", "text", "delimiter", "quote", "newline"]
+
+def encode_values(values: list, delimiter: str, quoting: int):
+    """Returns values as they are written in a csv file, quoted or escaped when needed"""
+    buffer = io.StringIO()
+    # The separator holds a line break, so values with line breaks are quoted
+    writer = csv.writer(buffer, delimiter=delimiter, quoting=quoting, lineterminator=SEPARATOR,
+                        escapechar="\\" if quoting == csv.QUOTE_NONE else None)
+    writer.writerows([value] for value in values)
+    return buffer.getvalue().split(SEPARATOR)[:-1]
+
+def make_pool(kind: str, count: int, generator: random.Random, delimiter: str, quoting: int):
+    """
+    Returns [count] encoded values of a given kind that a column takes its values from,
+    they are repeated after that so any [batch_size] values can be sliced from it
+    """
+    pool = encode_values([VALUE_KINDS[kind](generator, delimiter) for _ in range(count)], delimiter, quoting)
+    while len(pool) < count + batch_size:
+        pool.extend(pool[:count + batch_size - len(pool)])
+    return pool
+
+def generate_rows(number_of_collumns: int, kinds: list, delimiter: str, quoting: int,
+                  ragged: float, seed: int, pool_count: int = pool_size):
+    """
+    Yields batches of rows of random values encoded for a csv file,
+    the kinds of the columns are taken from [kinds] in turn, every column
+    takes its values from [pool_count] different ones, and [ragged]
+    is the share of the rows that end before the last column
+    """
+    generator = random.Random(seed)
+    column_kinds = [kinds[column % len(kinds)] for column in range(number_of_collumns)]
+    pools = [None if kind == "id" else make_pool(kind, pool_count, generator, delimiter, quoting)
+             for kind in column_kinds]
+    id_format = '"{}"' if quoting == csv.QUOTE_ALL else "{}"
+    start = 1
+    while True:
+        # Every column takes a run of its pool starting at a random position,
+        # so the rows differ while the values are copied in bulk
+        columns = []
+        for pool in pools:
+            if pool is None:
+                columns.append(map(id_format.format, range(start, start + batch_size)))
+            else:
+                offset = generator.randrange(pool_count)
+                columns.append(pool[offset:offset + batch_size])
+        rows = list(zip(*columns))
+        if ragged and number_of_collumns > 1:
+            for index in generator.sample(range(batch_size), round(batch_size * ragged)):
+                rows[index] = rows[index][:generator.randint(1, number_of_collumns - 1)]
+        start += batch_size
+        yield rows
+
+def generate_file(file_name: str, number_of_collumns: int = 2, number_of_rows: int = 2,
+                  cell_text: str = 'text', kinds: list = None, delimiter: str = ",",
+                  quoting: int = csv.QUOTE_MINIMAL, ragged: float = 0.0, seed: int = 0,
+                  size: int = None):
+    """
+    Writes a csv file of [number_of_rows] rows, or of at least [size] bytes when it is given.
+    Every cell holds [cell_text] unless [kinds] of columns are given,
+    then the cells hold random values of these kinds that depend only on [seed].
+    Returns the number of rows written.
+    """
+    if delimiter not in tables.valid_delimeters:
+        raise ValueError(f"Invalid delimiter: '{delimiter}'")
+    if number_of_collumns < 1:
+        raise ValueError(f"Invalid number of columns: {number_of_collumns}")
+    for kind in kinds or []:
+        if kind != "id" and kind not in VALUE_KINDS:
+            raise ValueError(f"Unknown kind of column: '{kind}'")
+    with open(file_name, 'w', encoding='utf-8', newline='', buffering=2 ** 20) as file:
+        if kinds is None:
+            # Every row is the same, so it is written in batches of the same text
+            row = delimiter.join([cell_text] * number_of_collumns)
+            rows_written = 0
+            while file.tell() < size if size is not None else rows_written < number_of_rows:
+                count = batch_size if size is not None else min(batch_size, number_of_rows - rows_written)
+                file.write("\n" * bool(rows_written) + "\n".join([row] * count))
+                rows_written += count
+            return rows_written
+
+        rows_written = 0
+        # Small files need fewer different values
+        pool_count = pool_size if size is not None else max(min(pool_size, number_of_rows), 1)
+        for rows in generate_rows(number_of_collumns, kinds, delimiter, quoting, ragged, seed, pool_count):
+            if size is None:
+                rows = rows[:number_of_rows - rows_written]
+            if not rows:
+                break
+            # The values are already encoded, so a batch is joined and written at once
+            file.write("\n".join(map(delimiter.join, rows)))
+            file.write("\n")
+            rows_written += len(rows)
+            if size is not None and file.tell() >= size:
+                break
+    return rows_written
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser(description="Generates a csv file of random values for testing")
+    argument_parser.add_argument("file_name",
+                                 help="path to the file",
+                                 type=str
+                                )
+    argument_parser.add_argument("-r", "--rows",
+                                 help="number of rows (default: 1000)",
+                                 type=int,
+                                 default=1000
+                                )
+    argument_parser.add_argument("-m", "--megabytes",
+                                 help="write rows until the file is this large instead",
+                                 type=float
+                                )
+    argument_parser.add_argument("-c", "--columns",
+                                 help="number of columns (default: one of each kind)",
+                                 type=int
+                                )
+    argument_parser.add_argument("-k", "--kinds",
+                                 help=f"kinds of the columns separated by commas, repeated over the columns "
+                                      f"(default: {','.join(default_kinds)}), "
+                                      f"or 'same' to fill every cell with 'text'",
+                                 type=str,
+                                 default=",".join(default_kinds)
+                                )
+    argument_parser.add_argument("-d", "--delimiter",
+                                 help="delimiter of the values (default: ',')",
+                                 type=str,
+                                 default=","
+                                )
+    argument_parser.add_argument("-q", "--quoting",
+                                 help="quoting style (default: minimal)",
+                                 choices=QUOTING_STYLES,
+                                 default="minimal"
+                                )
+    argument_parser.add_argument("--ragged",
+                                 help="share of the rows that end before the last column (default: 0)",
+                                 type=float,
+                                 default=0.0
+                                )
+    argument_parser.add_argument("-s", "--seed",
+                                 help="seed of the random values (default: 0)",
+                                 type=int,
+                                 default=0
+                                )
+    arguments = argument_parser.parse_args()
+
+    kinds = None if arguments.kinds == "same" else arguments.kinds.split(",")
+    delimiter = "\t" if arguments.delimiter == "\\t" else arguments.delimiter
+    start = time.perf_counter()
+    try:
+        rows = generate_file(arguments.file_name,
+                             number_of_collumns=arguments.columns or len(kinds or [None]),
+                             number_of_rows=arguments.rows,
+                             kinds=kinds,
+                             delimiter=delimiter,
+                             quoting=QUOTING_STYLES[arguments.quoting],
+                             ragged=arguments.ragged,
+                             seed=arguments.seed,
+                             size=None if arguments.megabytes is None else int(arguments.megabytes * 2 ** 20))
+    except ValueError as error:
+        print(f"[Error] {error}")
+        sys.exit(3)
+    except PermissionError:
+        print(f"[Error] Access denied: '{arguments.file_name}'")
+        sys.exit(2)
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    size = os.path.getsize(arguments.file_name) / 2 ** 20
+    print(f"Wrote {rows} rows ({size:.1f} MB) in {elapsed:.2f} s, {size / elapsed:.1f} MB/s")
+    sys.exit(0)
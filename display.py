@@ -0,0 +1,65 @@
+"""
+This module is a part of CSVEdit.
+It contains a "Display" class that shows the frames composed by the renderer
+module on a curses window, redrawing only the lines that have changed.
+"""
+import curses
+
+import renderer
+
+def get_curses_attribute(attribute: int):
+    """Returns the curses attribute of a combination of render attributes"""
+    curses_attribute = curses.A_NORMAL
+    if attribute & renderer.REVERSE:
+        curses_attribute |= curses.A_REVERSE
+    if attribute & renderer.UNDERLINE:
+        curses_attribute |= curses.A_UNDERLINE
+    if attribute & renderer.BLINK:
+        curses_attribute |= curses.A_BLINK
+    return curses_attribute
+
+class Display:
+    """
+    A curses window that frames are shown on. The lines of the last frame
+    that was shown are kept, and the lines of a new frame that are the same
+    are not drawn again, so a frame only costs as much as what changed on the screen.
+    """
+    def __init__(self, window):
+        # Creates a display that draws on a curses window
+        self.window = window
+        self.attributes = [get_curses_attribute(attribute)
+                           for attribute in range((renderer.REVERSE | renderer.UNDERLINE | renderer.BLINK) + 1)]
+        # Characters and attributes of the lines on the screen, None when they are not known
+        self.lines = []
+        self.line_attributes = []
+
+    def forget(self, *lines: int):
+        """Marks lines (or all of them if none are given) as unknown, so they are drawn with the next frame"""
+        for y in lines or range(len(self.lines)):
+            if 0 <= y < len(self.lines):
+                self.lines[y] = None
+
+    def clear(self):
+        """Clears the window, so the next frame is drawn whole"""
+        self.window.clear()
+        self.forget()
+
+    def show(self, frame: renderer.Frame):
+        """Draws the lines of a frame that differ from the ones on the screen"""
+        if len(self.lines) != frame.height:
+            self.lines = [None] * frame.height
+            self.line_attributes = [None] * frame.height
+        for y in range(frame.height):
+            if self.lines[y] == frame.lines[y] and self.line_attributes[y] == frame.attributes[y]:
+                continue
+            for x, text, attribute in frame.runs(y):
+                try:
+                    self.window.addstr(y, x, text, self.attributes[attribute])
+                except curses.error:
+                    # Writing the bottom right corner moves the cursor off the screen
+                    pass
+            # The line might have been drawn over by another window
+            self.window.touchline(y, 1)
+            self.lines[y] = frame.lines[y]
+            self.line_attributes[y] = frame.attributes[y]
+        self.window.noutrefresh()
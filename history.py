@@ -0,0 +1,134 @@
+"""
+This module is a part of CSVEdit.
+It contains a "History" class that allows undoing and redoing
+the changes made to a table.
+"""
+import sys
+from collections import deque
+
+# Maximum number of bytes held by the values kept in the history,
+# the oldest changes are forgotten first when there are more
+# Default: 134217728
+memory_limit = 128 * 2 ** 20
+
+def get_size(value):
+    """Returns the approximate number of bytes held by a value kept in the history"""
+    if hasattr(value, "nbytes"):
+        return value.nbytes()
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(map(get_size, value))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(map(get_size, value.items()))
+    return sys.getsizeof(value)
+
+def perform(table, operation: str, *args):
+    """
+    Calls a method of a table that changes it,
+    and returns the operations that revert the change
+    """
+    match operation:
+        case "set_cell":
+            column, row, value = args
+            old_value = table.get_cell(column, row)
+            table.set_cell(column, row, value)
+            return [("set_cell", column, row, old_value)]
+        case "insert_row":
+            table.insert_row(*args)
+            return [("remove_row", args[0] + 1)]
+        case "insert_column":
+            table.insert_column(*args)
+            return [("remove_column", args[0] + 1)]
+        case "insert_rows":
+            row_index, count = args
+            table.insert_rows(row_index, count)
+            return [("remove_rows", row_index + 1, row_index + 1 + count)]
+        case "remove_row":
+            row = args[0]
+            return [("insert_row", row - 1, table.remove_row(row))]
+        case "remove_rows":
+            # The values of the removed rows are set again in new ones
+            start, stop = args
+            rows = table.get_rows(start, stop)
+            table.remove_rows(start, stop)
+            return [("insert_rows", start - 1, stop - start)] + [("set_cell", column, row, value)
+                                                                 for row, values in enumerate(rows, start)
+                                                                 for column, value in enumerate(values, 1)
+                                                                 if value is not None]
+        case "remove_column":
+            # The removed column itself is kept, so restoring it copies nothing
+            column = args[0]
+            return [("insert_column", column - 1, table.remove_column(column))]
+        case "sort_rows":
+            return [("permute_rows", table.sort_rows(*args))]
+        case "permute_rows":
+            return [("permute_rows", table.permute_rows(*args))]
+    raise ValueError(f"Unknown operation: '{operation}'")
+
+def perform_step(table, step: list, done=None):
+    """
+    Performs the operations of a step and returns the step that reverts them,
+    [done] is called with every operation right after it was performed
+    """
+    reverse = []
+    for operation in step:
+        reverse[:0] = perform(table, *operation)
+        if done:
+            done(*operation)
+    return reverse
+
+class History:
+    """
+    Undo and redo history of the changes made to a table.
+    A change is kept as the operations that revert it rather than
+    a copy of the table, removed columns and rows are kept as they were.
+    """
+    def __init__(self, limit: int = None):
+        # Creates an empty history that holds at most [limit] bytes
+        self.limit = memory_limit if limit is None else limit
+        self.undo_steps = deque()
+        self.redo_steps = deque()
+        self.size = 0
+
+    def apply(self, table, operation: str, *args):
+        """Changes a table and remembers how to revert the change"""
+        self.apply_step(table, [(operation, *args)])
+
+    def apply_step(self, table, step: list):
+        """Performs the operations of a step as one change that is reverted at once"""
+        self.push(self.undo_steps, perform_step(table, step))
+        for step in self.redo_steps:
+            self.size -= get_size(step)
+        self.redo_steps.clear()
+        self.trim()
+
+    def undo(self, table, done=None):
+        """
+        Reverts the last change, returns False if there is nothing to revert.
+        [done] is called with every operation that reverts it (see "perform_step").
+        """
+        return self.move(table, self.undo_steps, self.redo_steps, done)
+
+    def redo(self, table, done=None):
+        """Repeats the last reverted change, returns False if there is nothing to repeat"""
+        return self.move(table, self.redo_steps, self.undo_steps, done)
+
+    def move(self, table, source, target, done=None):
+        # Performs the last step of [source] and adds its reverse to [target]
+        if not source:
+            return False
+        step = source.pop()
+        self.size -= get_size(step)
+        self.push(target, perform_step(table, step, done))
+        self.trim()
+        return True
+
+    def push(self, steps, step: list):
+        # Adds a step to the end of a list of steps
+        steps.append(step)
+        self.size += get_size(step)
+
+    def trim(self):
+        # Forgets the oldest changes until the history fits in its limit
+        while self.size > self.limit and (self.undo_steps or self.redo_steps):
+            steps = self.undo_steps or self.redo_steps
+            self.size -= get_size(steps.popleft())
@@ -114,7 +114,8 @@ class InputField:
             self.window.addch(0, screen_pos, ' ', curses.A_REVERSE)
         self.window.refresh()
 
-def get_input(window, contents: str = None, CancelReturnsNone: bool = False):
+def get_input(window, contents: str = None, CancelReturnsNone: bool = False,
+              on_change = None):
     """
     The default way to use inputfield.
     Requires a curses window and creates InputField from it.
@@ -122,6 +123,7 @@ def get_input(window, contents: str = None, CancelReturnsNone: bool = False):
     allows the rest of the program to continue operation. When escape
     is hit returns the original contents, or None if CanceReturnsNone = True.
     Suports home and end keys, left and right arrow keys, backspace and delete.
+    If [on_change] is given, it is called with the contents every time they change.
     """
 
     special_keys = [ 10, 13, -1, 27,
@@ -161,6 +163,7 @@ def get_input(window, contents: str = None, CancelReturnsNone: bool = False):
     while True:
         input_window.show()
         key = window.getch()
+        old_contents = list(input_window.contents)
         if key not in special_keys:
             input_window.set_character(chr(key))
         if key == curses.KEY_RIGHT:
@@ -181,3 +184,5 @@ def get_input(window, contents: str = None, CancelReturnsNone: bool = False):
             return input_window.contents_backup
         if key in [curses.KEY_ENTER, 10, 13]:
             return input_window.gather()
+        if on_change and input_window.contents != old_contents:
+            on_change(input_window.gather())
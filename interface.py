@@ -1,10 +1,32 @@
 import os
+import time
 import curses
-import pyperclip
+import threading
 
 import tables
+import lazytables
+import journal
+import history
+import search
+import views
 import inputfield
 import visuals
+import renderer
+import display
+import keybinds
+
+# Keys of the commands that change the rows or columns of the table
+STRUCTURE_KEYS = [visuals.KEY_C.code, visuals.KEY_SC.code,
+                  visuals.KEY_V.code, visuals.KEY_SV.code,
+                  visuals.KEY_X.code, visuals.KEY_SX.code,
+                  visuals.KEY_Z.code, visuals.KEY_SZ.code,
+                  visuals.KEY_U.code, visuals.KEY_SU.code,
+                  visuals.KEY_O.code, visuals.KEY_SO.code]
+
+def get_clipboard():
+    """Returns the pyperclip module, which is only imported once the clipboard is used"""
+    import pyperclip
+    return pyperclip
 
 class Editor:
     def __init__(self, key_hint: dict,
@@ -13,7 +35,11 @@ class Editor:
                  absolute_path: str,
                  read_only: bool,
                  new_file: bool,
-                 key_bind_table: tables.Table):
+                 key_bind_table: tables.Table = None,
+                 loader = None,
+                 journal = None,
+                 history = None,
+                 profiler = None):
         self.key_hint = key_hint
         self.max_cell_length = max_cell_len
         self.table = table
@@ -21,14 +47,17 @@ class Editor:
         self.read_only = read_only
         self.new_file = new_file
         self.key_bind_table = key_bind_table
+        # The table is only used while holding the lock of its loader
+        self.loader = loader
+        self.lock = loader.lock if loader else threading.Lock()
+        self.journal = journal
+        self.history = history
+        self.profiler = profiler
 
         self.info = visuals.Info(default_message = self.key_hint["edit"] + self.key_hint["quit"] + " ")
         if self.read_only:
             self.info = visuals.Info(default_message = self.key_hint["quit"] + " ")
 
-        self.table_height = self.table.row_count + 1
-        self.table_width = self.table.column_count * self.max_cell_length + self.table.column_count * 3
-
     def edit(self, scr):
         scr.keypad(True)
         scr.clear()
@@ -39,12 +68,18 @@ class Editor:
 
         shown_collumns = []
         shown_rows = []
+        column_positions = {}
+        damage = visuals.Damage()
         x_shift = 0
         y_shift = 0
 
         changes = False
         if self.new_file:
             changes = True
+        loaded = None
+        search_query = None
+        # The rows that are shown when they are filtered
+        view = None
 
         address = f"({pointer.column:>3}:{pointer.row:<3})"
         row_width = len(str(self.table.row_count))
@@ -52,6 +87,23 @@ class Editor:
 
         input_win = curses.newwin(1, width - 2, height - 1, 2)
         key_pad = curses.newpad(1, 1)
+        # The panels are laid out in a frame, and the lines that changed are drawn on the screen
+        frame = renderer.Frame(height, width)
+        screen = display.Display(scr)
+        # Texts of the rows that were shown, by their numbers in the shown table
+        cell_texts = renderer.CellCache()
+
+        read_input = inputfield.get_input
+        if self.profiler:
+            # Waiting for the user to type is not counted in the time of a frame
+            read_input = self.profiler.waited(inputfield.get_input)
+
+        def get_input(*args, **kwargs):
+            """Reads a value typed in the input field, which is drawn over the last line of the screen"""
+            try:
+                return read_input(*args, **kwargs)
+            finally:
+                screen.forget(height - 1)
 
         def clean(string: str):
             string = string.strip()
@@ -63,41 +115,56 @@ class Editor:
                     returnstring += letter
             return returnstring
 
+        def shown():
+            """Returns the table that is shown: the filtered view of its rows, or the table itself"""
+            return view or self.table
+
+        def row_number(row: int):
+            """Returns the number in the table of a row that is shown"""
+            return view.rows[row - 1] if view else row
+
         def update_table_size():
             nonlocal row_width
 
-            self.table_height = self.table.row_count + 1
-            self.table_width = self.table.column_count * self.max_cell_length + self.table.column_count * 3
             row_width = len(str(self.table.row_count))
 
         def save_as():
+            wait_for_loader()
             self.info.set_alert('?', "Save as: " + self.key_hint["confirm"] + self.key_hint["cancel"])
-            update_all()
-            file_path = inputfield.get_input(input_win, self.absolute_path, CancelReturnsNone= True)
+            update_alert()
+            file_path = get_input(input_win, self.absolute_path, CancelReturnsNone= True)
             if file_path:
                 try:
+                    start = time.perf_counter()
                     tables.file_save(self.table, file_path)
+                    if self.profiler:
+                        self.profiler.record_file("file_save", file_path, time.perf_counter() - start,
+                                                  os.path.getsize(file_path))
+                    if self.journal and os.path.realpath(file_path) == os.path.realpath(self.absolute_path):
+                        # The journal holds the changes to the opened file,
+                        # saving a copy somewhere else leaves them unsaved in it
+                        self.journal.clear()
                     self.info.reset_alert()
-                    update_all()
+                    update_alert()
                     return 1
                 except PermissionError:
                     show_error("Error: Access denied")
                     return 2
             self.info.reset_alert()
-            update_all()
+            update_alert()
             return 0
 
         def show_error(message: str):
             self.info.set_alert('!', message + self.key_hint["confirm"])
-            update_all()
-            inputfield.get_input(input_win)
+            update_alert()
+            get_input(input_win)
             self.info.reset_alert()
-            update_all()
+            update_alert()
 
         def show_prompt(message: str):
             self.info.set_alert('?', message + "[y/n]" + self.key_hint["cancel"])
-            update_all()
-            answer = inputfield.get_input(input_win)
+            update_alert()
+            answer = get_input(input_win)
             if str(answer).strip().lower() in ['yes', 'y']:
                 answer = True
             elif str(answer).strip().lower() in ['no', 'n']:
@@ -105,7 +172,7 @@ class Editor:
             else:
                 answer = None
             self.info.reset_alert()
-            update_all()
+            update_alert()
             return answer
 
 
@@ -122,160 +189,259 @@ class Editor:
 
             message = self.info.message
 
-            if self.info.show_mode:
-                spacer_len = (width-2)-(len(self.info.message) + len(" Mode:") + row_width)
-                if spacer_len > 0:
-                    message = f"{message}{' ':^{spacer_len}} Mode:"
-
-            if len(message) >= width - 1:
-                message = ' '
+            if self.profiler and self.profiler.overlay:
+                message = f"{message}  {self.profiler.overlay_text()}"
 
-            info_win = curses.newwin(1, width - row_width, height - 2, row_width)
-            info_win.addstr(0, 0, f"{message:<{width - row_width - 1}}", curses.A_REVERSE)
-            info_win.noutrefresh()
+            if self.info.show_mode:
+                self.info.set_aggregates(shown().get_aggregates(pointer.column_number))
+            renderer.draw_info(frame, message, self.info.aggregates, self.info.show_mode, row_width)
+
+        def visible_columns():
+            """Returns the numbers and display widths of the columns that fit on the screen"""
+            return renderer.visible_columns(self.table, x_shift, row_width, width, self.max_cell_length)
+
+        def visible_rows():
+            """Returns the rows of the shown table that fit on the screen"""
+            return range(y_shift + 1, min(shown().row_count, y_shift + renderer.table_height(frame)) + 1)
+
+        def cell_attribute(column_number: int, row: int):
+            """Returns the attribute of a cell: blinking under the pointer, underlined if it matches the search"""
+            attribute = renderer.NORMAL
+            if pointer.column_number == column_number and pointer.row == row:
+                attribute |= renderer.BLINK
+            if search_query and search.matches(shown().get_cell(column_number, row), search_query):
+                attribute |= renderer.UNDERLINE
+            return attribute
 
         def update_table():
-            table_pad = curses.newpad(max(self.table_height, height), max(self.table_width, width))
+            columns = visible_columns()
             shown_collumns.clear()
             shown_rows.clear()
-            for y in range(self.table.row_count - y_shift):
-                x_display = 0
-                y = y + y_shift
-                for x in range(self.table.column_count - x_shift):
-                    x = x + x_shift
-                    cell_display = self.table.get_cell(x + 1, y + 1)
-                    if cell_display is None or cell_display == '':
-                        cell_display = "-"
-                    cell_display = str(cell_display).strip()
-                    if len(cell_display) > self.max_cell_length:
-                        cell_display = cell_display[:self.max_cell_length - 3]
-                        cell_display = cell_display + "..."
-                    cell_display = f" {cell_display:^{min(self.table.max_len(x + 1), self.max_cell_length)}} "
-                    if pointer.column_number == x + 1 and pointer.row == y + 1:
-                        table_pad.addstr(y - y_shift, x_display, cell_display, curses.A_BLINK)
-                    else:
-                        table_pad.addstr(y - y_shift, x_display, cell_display)
-                    x_display = x_display + min(self.table.max_len(x + 1), self.max_cell_length) + 2
-                    table_pad.addstr(y - y_shift, x_display, '|')
-                    x_display += 1
-                    if x_display < width - 3 and tables.get_column(x + 1) not in shown_collumns:
-                        shown_collumns.append(tables.get_column(x + 1))
-                if y < height - 3 + y_shift:
-                    shown_rows.append(y + 1)
-            table_pad.noutrefresh(0, 0, 1, row_width, height - 3, width - 2)
+            column_positions.clear()
+            x_display = 0
+            for x, column_len in columns:
+                column_positions[x] = (x_display, column_len)
+                x_display += column_len + 3
+                if x_display < width - 3:
+                    shown_collumns.append(tables.get_column(x))
+            rows = visible_rows()
+            renderer.draw_table(frame, shown(), columns, rows, row_width, self.max_cell_length,
+                                cell_attribute, cell_texts)
+            shown_rows.extend(rows)
+
+        def update_cells(cells):
+            for column_number, row in cells:
+                if column_number not in column_positions or row not in shown_rows:
+                    continue
+                x_display, column_len = column_positions[column_number]
+                renderer.draw_cell(frame, shown(), column_number, row, y_shift, x_display, column_len,
+                                   row_width, self.max_cell_length, cell_attribute(column_number, row))
 
         def update_indicator():
-            indicator_win = curses.newwin(height - 2, 2, 1, width - 1)
             indicators = ''
             if self.info.alert:
                 indicators += self.info.alert
             indicators += get_quoting_ind(self.table.dialect.quoting)
-            indicators = f"{indicators:<{height - 3}}"
-            for index, symbol in enumerate(indicators):
-                indicator_win.addstr(index, 0, symbol, curses.A_REVERSE)
-            if self.read_only:
-                indicator_win.addstr(height - 3, 0, "R", curses.A_REVERSE + curses.A_UNDERLINE)
-            else:
-                indicator_win.addstr(height - 3, 0, self.info.mode, curses.A_REVERSE)
-            indicator_win.noutrefresh()
+            if self.loader:
+                indicators += f"{self.loader.progress()}%"
+            renderer.draw_indicator(frame, indicators, self.info.mode, self.read_only)
 
         def update_columns():
-            column_pad = curses.newpad(1, max(self.table_width + 2, width - 1))
-            x_display = 0
-            for x in range(self.table.column_count - x_shift):
-                x = x + x_shift
-                colum_len = min(self.table.max_len(x + 1), self.max_cell_length)
-                column_name = f" {str(tables.get_column(x + 1)):^{colum_len}} |"
-                column_pad.addstr(0, x_display, column_name, curses.A_REVERSE)
-                x_display = x_display + colum_len + 3
-            if x_display < width - 2:
-                column_spacer = ' ' * ((width - 2) - x_display)
-                column_pad.addstr(0, x_display, column_spacer, curses.A_REVERSE)
-            column_pad.noutrefresh(0, 0, 0, row_width, 0, width - 2)
+            renderer.draw_header(frame, visible_columns(), row_width, tables.get_column)
 
         def update_rows():
-            row_pad = curses.newpad(max(self.table_height, height - 2), row_width)
-            for y in range(self.table.row_count - y_shift):
-                y = y + y_shift
-                row_pad.addstr(y - y_shift, 0, f"{str(y + 1):^{row_width}}", curses.A_REVERSE)
-            if y + 1 < height - 3:
-                row_spacer  = ' '
-                for i in range(y + 1, height - 3):
-                    row_pad.addstr(i, 0, f"{row_spacer:^{row_width}}", curses.A_REVERSE)
-            row_pad.noutrefresh(0, 0, 1, 0, height - 3, row_width)
+            renderer.draw_row_numbers(frame, [row_number(row) for row in visible_rows()], row_width)
 
         def update_x():
-            x_win = curses.newwin(1, row_width, 0, 0)
-            if x_shift > 0 and y_shift > 0:
-                x_win.insstr(0, 0, f"{'X':^{row_width}}", curses.A_REVERSE)
-            elif x_shift > 0:
-                x_win.insstr(0, 0, f"{'<':^{row_width}}", curses.A_REVERSE)
-            elif y_shift > 0:
-                x_win.insstr(0, 0, f"{'^':^{row_width}}", curses.A_REVERSE)
-            else:
-                x_win.insstr(0, 0, f"{' ':^{row_width}}", curses.A_REVERSE)
-            x_win.noutrefresh()
+            renderer.draw_corner(frame, row_width, x_shift, y_shift)
 
         def update_v():
-            v_win = curses.newwin(1, row_width, height - 2, 0)
-            if shown_rows[-1] != self.table.row_count:
-                v_win.insstr(0, 0, f"{'V':^{row_width}}", curses.A_REVERSE)
-            else:
-                v_win.insstr(0, 0, f"{' ':^{row_width}}", curses.A_REVERSE)
-            v_win.noutrefresh()
+            renderer.draw_more_rows(frame, row_width, shown_rows[-1] != shown().row_count)
 
         def update_r():
-            r_win = curses.newwin(1, 2, 0, width - 1)
-            if shown_collumns[-1] != tables.get_column(self.table.column_count):
-                r_win.insstr(0, 0, ">", curses.A_REVERSE)
-            else:
-                r_win.insstr(0, 0, " ", curses.A_REVERSE)
-            r_win.noutrefresh()
+            renderer.draw_more_columns(frame, shown_collumns[-1] != tables.get_column(self.table.column_count))
 
         def update_input():
             nonlocal input_win
 
-            input_length = width - 2 - len(address)
-            cell_pad = curses.newpad(1, input_length + 1)
-            input_win = curses.newwin(1, input_length, height - 1, 2)
-            cell_pad.erase()
-            value = str(self.table.get_cell(pointer.column, pointer.row))
-            value = f"> {value}"
-            if len(value) > input_length:
-                value = value[:input_length - 3] + "..."
-            cell_pad.addstr(0, 0, value)
-            cell_pad.noutrefresh(0, 0, height - 1, 0, height - 1, input_length)
+            input_win = curses.newwin(1, renderer.input_width(frame, address), height - 1, 2)
+            renderer.draw_input(frame, shown().get_cell(pointer.column_number, pointer.row), address)
 
         def update_address():
-            address = f"({pointer.column:>3}:{pointer.row:<3})"
-            address_win = curses.newwin(1, len(address), height - 1, width - len(address))
-            address_win.insstr(0, 0, address, curses.A_REVERSE)
-            address_win.noutrefresh()
+            renderer.draw_address(frame, f"({pointer.column:>3}:{row_number(pointer.row):<3})")
+
+        # Panels in the order they are drawn in
+        panels = {'table': update_table,
+                  'x': update_x,
+                  'v': update_v,
+                  'r': update_r,
+                  'info': update_info,
+                  'columns': update_columns,
+                  'rows': update_rows,
+                  'input': update_input,
+                  'address': update_address,
+                  'indicator': update_indicator}
+        show_frame = screen.show
+        doupdate = curses.doupdate
+        if self.profiler:
+            # The stages of drawing are timed by replacing them with timed versions
+            panels = {name: self.profiler.timed(update.__name__, update) for name, update in panels.items()}
+            update_cells = self.profiler.timed("update_cells", update_cells)
+            show_frame = self.profiler.timed("show_frame", screen.show)
+            doupdate = self.profiler.timed("doupdate", curses.doupdate)
+
+        def render():
+            """Lays out the panels and cells that have changed since the last time and shows the frame"""
+            if 'table' not in damage.panels and damage.cells:
+                update_cells(damage.cells)
+            for name, update in panels.items():
+                if name in damage.panels:
+                    update()
+            damage.clear()
+            show_frame(frame)
 
         def update_all():
-            scr.clear()
+            nonlocal frame
+
+            frame = renderer.Frame(height, width)
+            screen.clear()
+            damage.add_panels(*panels)
+            render()
+
+        def update_alert():
+            damage.add_panels('info', 'indicator', 'input')
+            render()
+
+        def update_layout():
+            """Redraws everything that depends on the size and position of the table"""
+            update_table_size()
+            # Rows and columns might have been added, removed or moved
+            cell_texts.clear()
             update_table()
-            update_x()
-            update_v()
-            update_r()
-            update_info()
-            update_columns()
-            update_rows()
-            update_input()
-            update_address()
-            update_indicator()
-            curses.flash()
+            damage.add_panels(*panels)
+
+        def change(operation: str, *args):
+            """Calls a method of the table that changes it and records the call in the journal"""
+            change_step([(operation, *args)])
+
+        def change_step(step: list):
+            """
+            Calls methods of the table that change it as one change,
+            that is undone at once, and records the calls in the journal
+            """
+            nonlocal changes
+
+            self.history.apply_step(self.table, step)
+            if self.journal:
+                self.journal.record_step(step)
+            changes = True
+
+        def remove_column():
+            """Removes the column under the pointer, an empty one takes its place in a table of 2 columns"""
+            step = [("remove_column", pointer.column_number)]
+            if self.table.column_count == 2:
+                step.insert(0, ("insert_column", pointer.column_number + 1))
+            change_step(step)
+            update_layout()
+            move('left')
+
+        def removed_rows():
+            """Returns the numbers of the rows that are removed, the one under the pointer and the [count] - 1 after it"""
+            return range(pointer.row, min(pointer.row + count, self.table.row_count + 1))
+
+        def remove_rows():
+            """Removes the rows from the one under the pointer, an empty one takes their place when they are all the rows"""
+            rows = removed_rows()
+            # A single row is kept as it was, so undoing its removal copies nothing
+            step = [("remove_row", rows.start)] if len(rows) == 1 else [("remove_rows", rows.start, rows.stop)]
+            if len(rows) == self.table.row_count:
+                step.insert(0, ("insert_row", rows.stop - 1))
+            change_step(step)
+            update_layout()
+            move('up')
+
+        def revert(operation: str):
+            """Undoes or redoes the last change and records what it did in the journal"""
+            nonlocal changes
+
+            performed = []
+
+            def done(*performed_operation):
+                performed.extend(journal.describe(self.table, *performed_operation))
+
+            if not getattr(self.history, operation)(self.table, done if self.journal else None):
+                return
+            if self.journal:
+                self.journal.record_step(performed)
+            changes = True
+            update_layout()
+            # The row or the column under the pointer might have been removed
+            move('up', pointer.row - self.table.row_count)
+            move('left', pointer.column_number - self.table.column_count)
+
+        def set_cell(value):
+            """Changes the value of the cell under the pointer"""
+            column_len = min(self.table.max_len(pointer.column_number), self.max_cell_length)
+            change("set_cell", pointer.column_number, row_number(pointer.row), value)
+            cell_texts.forget(pointer.column_number, pointer.row)
+            if view:
+                view.edit(row_number(pointer.row))
+            if min(self.table.max_len(pointer.column_number), self.max_cell_length) != column_len:
+                damage.add_panels('table', 'columns', 'r')
+            else:
+                damage.add_cell(pointer.column_number, pointer.row)
+            damage.add_panels('info', 'indicator')
+
+        def update_loading():
+            """Shows the progress of loading the file and the rows that were added"""
+            nonlocal loaded
+
+            if self.loader is None:
+                return
+            if not self.loader.is_alive():
+                error = self.loader.error
+                self.loader = None
+                damage.add_panels('indicator')
+                if error:
+                    # Saving a part of the file over it would lose the rest
+                    self.read_only = True
+                    show_error(f"Error: The file was only partly loaded ({error})")
+            state = (self.table.row_count, self.table.column_count, visible_columns())
+            if state != loaded:
+                loaded = state
+                update_table_size()
+                damage.add_panels(*panels)
+            elif self.loader:
+                damage.add_panels('indicator')
+            render()
+
+        def wait_for_loader():
+            """Waits until the whole file is loaded"""
+            if self.loader is None:
+                return
+            self.info.set_alert('~', "Loading the file...")
+            update_alert()
+            while self.loader:
+                self.lock.release()
+                self.loader.join(0.1)
+                self.lock.acquire()
+                update_loading()
+                doupdate()
+            self.info.reset_alert()
+            update_alert()
 
         def move(direction: str = None, repeat: int = 1):
             nonlocal x_shift, y_shift
 
+            damage.add_cell(pointer.column_number, pointer.row)
+            shift = (x_shift, y_shift)
             match direction:
                 case 'up' if pointer.row > 1:
                     for _ in range(repeat):
                         pointer.up()
                         if pointer.row not in shown_rows:
                             y_shift -= 1
-                case 'down' if pointer.row < self.table.row_count:
+                case 'down' if pointer.row < shown().row_count:
                     for _ in range(repeat):
                         pointer.down()
                         if pointer.row not in shown_rows:
@@ -290,25 +456,119 @@ class Editor:
                         pointer.right()
                         if pointer.column not in shown_collumns:
                             x_shift += 1
-            update_table()
-            update_r()
-            update_v()
-            update_x()
-            update_columns()
-            update_rows()
-            update_input()
-            update_address()
-
+            if (x_shift, y_shift) != shift:
+                damage.add_panels('table', 'x', 'v', 'r', 'columns', 'rows')
+            damage.add_cell(pointer.column_number, pointer.row)
+            damage.add_panels('input', 'address', 'info', 'indicator')
+            render()
+
+        def jump(column_number: int, row: int):
+            """Moves the pointer to a given cell"""
+            if row != pointer.row:
+                move('down' if row > pointer.row else 'up', abs(row - pointer.row))
+            if column_number != pointer.column_number:
+                move('right' if column_number > pointer.column_number else 'left',
+                     abs(column_number - pointer.column_number))
+
+        def find():
+            """Searches the table while the query is typed and moves the pointer to the first match"""
+            nonlocal search_query
+
+            origin = (pointer.column_number, pointer.row)
+            hint = self.key_hint["confirm"] + self.key_hint["cancel"]
+            self.info.set_alert('?', "Find: " + hint)
+            update_alert()
+            field = input_win
+
+            def show_match(query: str):
+                nonlocal search_query
+
+                search_query = query.lower() or None
+                found = search.find(shown(), search_query, *origin, inclusive=True) if search_query else None
+                damage.add_panels('table')
+                jump(*(found or origin))
+                self.info.set_alert('?', ("Find: " if found or not search_query else "Not found: ") + hint)
+                update_alert()
+                # The field was drawn over by the pointer's cell
+                field.touchwin()
+
+            query = get_input(field, CancelReturnsNone=True, on_change=show_match)
+            if query is None:
+                search_query = None
+                damage.add_panels('table')
+                jump(*origin)
+            self.info.reset_alert()
+            update_alert()
+
+        def find_next(backwards: bool):
+            """Moves the pointer to the next (or previous) cell that matches the search"""
+            if not search_query:
+                return
+            found = search.find(shown(), search_query, pointer.column_number, pointer.row, backwards)
+            if found:
+                jump(*found)
+
+        def show_rows(new_view, row: int):
+            """Shows the rows of a view (or of the whole table if it is None) from the top"""
+            nonlocal view, y_shift
+
+            view = new_view
+            y_shift = 0
+            pointer.row = 1
+            update_layout()
+            move('down', row - 1)
+
+        def filter_rows():
+            """Shows only the rows whose cells in the column under the pointer are equal to a value"""
+            wait_for_loader()
+            value = shown().get_cell(pointer.column_number, pointer.row)
+            self.info.set_alert('?', f"Show rows where {pointer.column} is: "
+                                + self.key_hint["confirm"] + self.key_hint["cancel"])
+            update_alert()
+            text = get_input(input_win, "" if value is None else str(value), CancelReturnsNone=True)
+            self.info.reset_alert()
+            update_alert()
+            if text is None:
+                return
+            filtered = (view or views.RowView(self.table)).filter(pointer.column_number, text or None)
+            if not filtered.row_count:
+                show_error("No rows match")
+                return
+            show_rows(filtered, 1)
+
+        def show_all_rows():
+            """Shows all the rows of the table again, keeping the pointer on the same row"""
+            if view:
+                show_rows(None, row_number(pointer.row))
+
+        self.lock.acquire()
         update_all()
-        curses.doupdate()
+        doupdate()
 
         key_pad.keypad(True)
+        # Digits typed before v, V, z or Z are the number of rows they add or remove
+        typed_count = ""
 
         while True:
+            # The loader can only change the table while waiting for a key
+            self.lock.release()
             user_input = key_pad.getch()
+            if self.profiler:
+                self.profiler.start_frame()
+            self.lock.acquire()
             height, width = scr.getmaxyx()
+            count = int(typed_count or 1)
+            if typed_count and user_input not in (-1, curses.KEY_RESIZE) \
+                    and not ord('0') <= user_input <= ord('9'):
+                # The number is only used by the key that follows it
+                typed_count = ""
+                self.info.reset_messsage()
+                damage.add_panels('info', 'indicator')
             match user_input:
-                case visuals.KEY_F1.code if self.table != self.key_bind_table:
+                case visuals.KEY_F1.code if self.table is not self.key_bind_table:
+                    if self.key_bind_table is None:
+                        # The list of keybinds is only made when it is first shown
+                        self.key_bind_table = keybinds.get_table()
                     keybindviewer = Editor(key_hint=self.key_hint,
                                            max_cell_len=100,
                                            table=self.key_bind_table,
@@ -316,10 +576,23 @@ class Editor:
                                            read_only=True,
                                            new_file=False,
                                            key_bind_table=self.key_bind_table)
+                    self.lock.release()
                     keybindviewer.edit(scr)
+                    self.lock.acquire()
                     update_all()
                 case visuals.KEY_F5.code:
+                    cell_texts.clear()
                     update_all()
+                case visuals.KEY_F.code:
+                    find()
+                case visuals.KEY_W.code:
+                    filter_rows()
+                case visuals.KEY_SW.code:
+                    show_all_rows()
+                case visuals.KEY_N.code:
+                    find_next(backwards=False)
+                case visuals.KEY_SN.code:
+                    find_next(backwards=True)
                 case visuals.KEY_Q.code:
                     if changes:
                         answer = show_prompt("Do you want to save changes to the file?")
@@ -354,103 +627,93 @@ class Editor:
                 case visuals.KEY_PGUP.code:
                     move('up', pointer.row - 1)
                 case visuals.KEY_PGDN.code:
-                    move('down', self.table.row_count - pointer.row)
+                    move('down', shown().row_count - pointer.row)
                 case 27:
                     user_input2 = key_pad.getch()
                     match user_input2:
                         case visuals.KEY_C.code:
-                            pyperclip.copy(self.table.get_cell(pointer.column, pointer.row))
+                            get_clipboard().copy(shown().get_cell(pointer.column_number, pointer.row))
                         case visuals.KEY_V.code if not self.read_only:
-                            changes = True
-                            self.table.set_cell(pointer.column,
-                                                pointer.row,
-                                                clean(pyperclip.paste()))
+                            set_cell(clean(get_clipboard().paste()))
                             move()
                         case visuals.KEY_X.code if not self.read_only:
-                            changes = True
-                            pyperclip.copy(self.table.get_cell(pointer.column, pointer.row))
-                            self.table.set_cell(pointer.column, pointer.row, None)
+                            get_clipboard().copy(shown().get_cell(pointer.column_number, pointer.row))
+                            set_cell(None)
                             move()
             if not self.read_only:
+                if user_input in STRUCTURE_KEYS:
+                    # Rows and columns of the file are added by their position
+                    wait_for_loader()
+                    # and they are changed in the whole table
+                    show_all_rows()
                 match user_input:
+                    case digit if ord('0') <= digit <= ord('9') and (typed_count or digit != ord('0')):
+                        typed_count += chr(digit)
+                        self.info.set_message(f" rows: {typed_count}", True)
+                        damage.add_panels('info', 'indicator')
+                        render()
                     case curses.KEY_ENTER | 10 | 13 if self.info.mode == 'R':
                         self.info.mode = 'E'
                         self.info.set_message(self.key_hint["confirm"] + self.key_hint["cancel"],
                                               True)
-                        update_info()
-                        update_indicator()
-                        update_input()
-                        update_address()
-                        value = self.table.get_cell(pointer.column, pointer.row)
-                        value = inputfield.get_input(input_win, value)
-                        self.table.set_cell(pointer.column, pointer.row, value)
-                        changes = True
+                        damage.add_panels('info', 'indicator', 'input', 'address')
+                        render()
+                        value = shown().get_cell(pointer.column_number, pointer.row)
+                        value = get_input(input_win, value)
+                        set_cell(value)
                         self.info.reset_messsage()
                         self.info.mode = 'R'
-                        update_all()
+                        damage.add_panels('info', 'indicator')
+                        move()
                     case visuals.KEY_DELETE.code:
-                        self.table.set_cell(pointer.column, pointer.row, None)
-                        changes = True
+                        set_cell(None)
                         move()
                     case visuals.KEY_C.code:
-                        self.table.insert_column(pointer.column_number)
-                        changes = True
-                        update_table_size()
-                        update_table()
+                        change("insert_column", pointer.column_number)
+                        update_layout()
                         move('right')
                     case visuals.KEY_V.code:
-                        self.table.insert_row(pointer.row)
-                        changes = True
-                        update_table_size()
-                        update_table()
+                        change("insert_rows", pointer.row, count)
+                        update_layout()
                         move('down')
                     case visuals.KEY_SC.code:
-                        self.table.insert_column(pointer.column_number - 1)
-                        changes = True
-                        update_table_size()
-                        update_table()
+                        change("insert_column", pointer.column_number - 1)
+                        update_layout()
                         move()
                     case visuals.KEY_SV.code:
-                        self.table.insert_row(pointer.row - 1)
-                        changes = True
-                        update_table_size()
-                        update_table()
+                        change("insert_rows", pointer.row - 1, count)
+                        update_layout()
                         move()
-                    case visuals.KEY_X.code if self.table.column_is_empty(pointer.column) \
+                    case visuals.KEY_X.code if self.table.column_is_empty(pointer.column_number) \
                         or show_prompt(f"Remove column {pointer.column}? "):
-                        if self.table.column_count == 2:
-                            self.table.insert_column(pointer.column_number + 1)
-                        self.table.remove_column(pointer.column_number)
-                        changes = True
-                        update_table_size()
-                        update_table()
-                        move('left')
-                    case visuals.KEY_Z.code if self.table.row_is_empty(pointer.row) \
-                        or show_prompt(f"Remove row {pointer.row}? "):
-                        if self.table.row_count == 1:
-                            self.table.insert_row(pointer.row + 1)
-                        self.table.remove_row(pointer.row)
-                        changes = True
-                        update_table_size()
-                        update_table()
-                        move('up')
+                        remove_column()
+                    case visuals.KEY_Z.code if all(map(self.table.row_is_empty, removed_rows())) \
+                        or show_prompt(f"Remove row {pointer.row}? " if count == 1 else
+                                       f"Remove rows {pointer.row} to {removed_rows()[-1]}? "):
+                        remove_rows()
                     case visuals.KEY_SX.code:
-                        if self.table.column_count == 2:
-                            self.table.insert_column(pointer.column_number + 1)
-                        self.table.remove_column(pointer.column_number)
-                        changes = True
-                        update_table_size()
-                        update_table()
-                        move('left')
+                        remove_column()
                     case visuals.KEY_SZ.code:
-                        if self.table.row_count == 1:
-                            self.table.insert_row(pointer.row + 1)
-                        self.table.remove_row(pointer.row)
-                        changes = True
-                        update_table_size()
-                        update_table()
-                        move('up')
-            curses.doupdate()
+                        remove_rows()
+                    case visuals.KEY_O.code | visuals.KEY_SO.code:
+                        change("sort_rows", pointer.column_number, user_input == visuals.KEY_SO.code)
+                        update_layout()
+                        move()
+                    case visuals.KEY_U.code:
+                        revert("undo")
+                    case visuals.KEY_SU.code:
+                        revert("redo")
+            update_loading()
+            if self.journal:
+                self.journal.sync(force=False)
+            doupdate()
+            if self.profiler and user_input != -1:
+                self.profiler.end_frame(user_input)
+                if self.profiler.overlay:
+                    damage.add_panels('info', 'indicator')
+                    render()
+                    doupdate()
+        self.lock.release()
 
 def start(**kwargs):
     """
@@ -467,21 +730,50 @@ def start(**kwargs):
                 'update':  f' {visuals.KEY_F5.text}:update',
                 }
 
-    table = tables.file_open(file_name)
-    key_bind_table = tables.file_open(kwargs.get("key_bind_file"))
+    profiler = kwargs.get("profiler")
+    start_time = time.perf_counter()
+    if kwargs.get("lazy"):
+        table, loader = lazytables.file_load(file_name)
+    else:
+        table, loader = tables.file_load(file_name, kwargs.get("workers"))
+    if profiler:
+        profiler.watch_loader(loader, file_name, start_time)
+
+    # Changes that were recorded before a crash are replayed over the whole file
+    table_history = history.History(kwargs.get("undo_memory"))
+    changes = kwargs.get("journal_changes")
+    if changes:
+        loader.join()
+        journal.replay(changes, table, table_history)
+    edit_journal = None
+    if not kwargs.get("read_only"):
+        edit_journal = journal.Journal(kwargs.get("journal_file"),
+                                       source=None if kwargs.get("new_file") else file_name,
+                                       append=bool(changes),
+                                       interval=kwargs.get("journal_interval"))
 
     editor = Editor(key_hint=key_hint,
                     max_cell_len=kwargs.get("cell_size"),
                     table=table,
                     absolute_path=kwargs.get("absolute_path"),
                     read_only=kwargs.get("read_only"),
-                    new_file=kwargs.get("new_file"),
-                    key_bind_table=key_bind_table)
+                    new_file=kwargs.get("new_file") or bool(changes),
+                    loader=loader,
+                    journal=edit_journal,
+                    history=table_history,
+                    profiler=profiler)
 
     try:
         curses.wrapper(editor.edit)
     except Exception as exception:
-        tables.file_save(table, temp_file)
+        # The journal keeps the changes until the next launch
+        if edit_journal:
+            edit_journal.sync()
         raise exception
+    finally:
+        if profiler and kwargs.get("profile_file"):
+            profiler.write(kwargs.get("profile_file"))
+    if edit_journal:
+        edit_journal.remove()
     if os.path.exists(temp_file):
         os.remove(temp_file)
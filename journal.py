@@ -0,0 +1,142 @@
+"""
+This module is a part of CSVEdit.
+It contains a "Journal" class that records the changes made to a table
+in an append-only file, and functions that replay them after a crash.
+"""
+import os
+import json
+import time
+
+# Number of seconds the recorded changes can wait before they are synced to the disk
+# Default: 1.0
+sync_interval = 1.0
+
+def get_version(source):
+    """Returns the size and modification time of a file, or None if there is no file"""
+    if not source:
+        return None
+    status = os.stat(source)
+    return [status.st_size, status.st_mtime_ns]
+
+class Journal:
+    """
+    An append-only log of the changes made to a table.
+    Every change is a line of JSON that names the method of the table
+    and its arguments, or a step of several calls that are undone at once.
+    Undoing and redoing changes is recorded as the calls it made.
+    Lines are buffered and the file is synced to the disk at most
+    every [interval] seconds, so keeping it does not cost a write
+    of the whole table.
+    The first line holds the version of the [source] file the changes
+    were made to, so they are never replayed over a different one.
+    """
+    def __init__(self, file_name: str, source: str = None,
+                 append: bool = False, interval: float = None):
+        # Opens a journal, [append] keeps the changes that are already in it
+        self.file_name = file_name
+        self.source = source
+        self.interval = sync_interval if interval is None else interval
+        self.file = open(file_name, "a" if append else "w", encoding="utf-8")
+        self.synced = time.monotonic()
+        self.pending = False
+        if not append:
+            self.write_header()
+
+    def write_header(self):
+        """Writes the version of the source file at the start of the journal"""
+        self.file.write(json.dumps(["open", get_version(self.source)]) + "\n")
+        self.pending = True
+        self.sync()
+
+    def record(self, operation: str, *args):
+        """Records a call of a method of the table"""
+        self.file.write(json.dumps([operation, *args]) + "\n")
+        self.pending = True
+        self.sync(force=False)
+
+    def record_step(self, step: list):
+        """Records calls of methods of the table that are undone and redone at once"""
+        if len(step) == 1:
+            self.record(*step[0])
+            return
+        self.file.write(json.dumps(["step", *map(list, step)]) + "\n")
+        self.pending = True
+        self.sync(force=False)
+
+    def sync(self, force: bool = True):
+        """
+        Writes the recorded changes to the disk,
+        unless [force] is False and the last sync was less than [interval] seconds ago
+        """
+        if not self.pending:
+            return
+        if not force and time.monotonic() - self.synced < self.interval:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.synced = time.monotonic()
+        self.pending = False
+
+    def clear(self):
+        """Forgets the recorded changes once they were saved to the source file"""
+        self.file.seek(0)
+        self.file.truncate()
+        self.write_header()
+
+    def remove(self):
+        """Closes and removes the journal"""
+        self.file.close()
+        os.remove(self.file_name)
+
+def read_changes(file_name: str, source: str = None):
+    """
+    Returns the changes recorded in a journal,
+    or None if they were made to a different version of the [source] file
+    """
+    changes = []
+    with open(file_name, encoding="utf-8") as file:
+        try:
+            header = json.loads(file.readline())
+        except json.JSONDecodeError:
+            return None
+        if header != ["open", get_version(source)]:
+            return None
+        for line in file:
+            try:
+                changes.append(json.loads(line))
+            except json.JSONDecodeError:
+                # The last line might have been cut off by the crash
+                break
+    return changes
+
+def describe(table, operation: str, *args):
+    """
+    Returns the calls that repeat an operation that was just performed on a table
+    with values that can be recorded. Undoing and redoing changes restores rows
+    and columns in forms that only the table that removed them knows, so they
+    are described as new ones that their values are set in.
+    """
+    match operation:
+        case "insert_row" if len(args) > 1 and args[1] is not None:
+            row = args[0] + 1
+            values = table.get_rows(row, row + 1)[0]
+            return [("insert_row", args[0])] + [("set_cell", column, row, value)
+                                                for column, value in enumerate(values, 1)
+                                                if value is not None]
+        case "insert_column" if len(args) > 1 and args[1] is not None:
+            column = args[0] + 1
+            values = table.get_column_values(column, 1, table.row_count + 1)
+            return [("insert_column", args[0])] + [("set_cell", column, row, value)
+                                                   for row, value in enumerate(values, 1)
+                                                   if value is not None]
+        case "permute_rows":
+            return [("permute_rows", list(args[0]))]
+    return [(operation, *args)]
+
+def replay(changes: list, table, table_history):
+    """Applies recorded changes to a table, keeping them in its history"""
+    for operation, *args in changes:
+        if operation == "step":
+            table_history.apply_step(table, args)
+        else:
+            table_history.apply(table, operation, *args)
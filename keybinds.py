@@ -0,0 +1,50 @@
+"""
+This module is a part of CSVEdit.
+It contains the list of keybinds that the editor shows on F1,
+kept as python values, so showing it needs no file to be read and sniffed.
+"""
+import csv
+
+import tables
+
+# Keys of the editor and what they do
+KEY_BINDS = [("q", "Exit the editor"),
+             ("s", "Save the current file as"),
+             ("arrow keys", "Navigate the table"),
+             ("Home", "Jump to the first cell in the row"),
+             ("End", "Jump to the last cell in the row"),
+             ("PgUp", "Jump to the top of the column"),
+             ("PgDn", "Jump to the bottom of the column"),
+             ("Enter", "Edit the current cell / Confirm changes"),
+             ("Esc", "Cancel action / Discard changes"),
+             ("Delete", "Delete contents of the current cell"),
+             ("c", "Add an empty column to the right"),
+             ("C", "Add an empty column to the left"),
+             ("v", "Add an empty row to the bottom"),
+             ("V", "Add an empty row to the top"),
+             ("x", "Delete column"),
+             ("X", "Force delete column"),
+             ("z", "Delete row"),
+             ("Z", "Force delete column"),
+             ("0-9", "Type the number of rows the next v, V, z or Z adds or deletes"),
+             ("u", "Undo the last change"),
+             ("U", "Redo the last undone change"),
+             ("f", "Find a value as you type"),
+             ("n", "Jump to the next match"),
+             ("N", "Jump to the previous match"),
+             ("o", "Sort the rows by the current column"),
+             ("O", "Sort the rows by the current column in descending order"),
+             ("w", "Show only the rows where the current column has a value"),
+             ("W", "Show all the rows"),
+             ("F1", "Show this list of keybinds"),
+             ("F5", "Update the screen"),
+             ("Alt + c", "Copy cell contents to clipboard"),
+             ("Alt + v", "Paste clipboard contents to the cell"),
+             ("Alt + x", "Cut cell contents")]
+
+def get_table():
+    """Returns a table of the keybinds"""
+    table = tables.Table(0, 0)
+    table.dialect = csv.excel
+    table.extend_rows(KEY_BINDS)
+    return table
@@ -0,0 +1,510 @@
+"""
+This module is a part of CSVEdit.
+It contains a "LazyTable" class that shows a memory-mapped csv file
+as a table without reading all of it, and a function that opens files
+as lazy tables.
+"""
+import io
+import os
+import csv
+import mmap
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from itertools import accumulate, compress, zip_longest
+from operator import methodcaller, not_
+
+import tables
+from loader import Loader
+from storage import RowIndex
+
+# Every [stride]th row's offset in the file is kept in the index,
+# the rows between them are parsed together when one of them is needed
+# Default: 64
+stride = 64
+
+# Number of bytes of the file that are indexed at once
+# Default: 16777216
+chunk_size = 16 * 2 ** 20
+
+# Number of parsed groups of rows kept in memory
+# Default: 256
+cached_groups = 256
+
+class LazyTable(tables.Table):
+    """
+    A table that reads a memory-mapped csv file on demand.
+    Opening it only builds an index of row offsets that respects quoted
+    line breaks, rows are parsed when they are needed, and edited cells
+    are kept in a sparse overlay on top of the file.
+    The number of columns and their widths grow as wider rows are parsed.
+    """
+    def __init__(self, file_name: str, dialect):
+        # Maps the file and indexes the rows in it
+        self.dialect = dialect
+        self.file = open(file_name, "rb")
+        self.data = b''
+        if os.path.getsize(file_name):
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        # Quotes are ordinary characters when the values are not quoted
+        self.quotechar = None
+        if dialect.quoting != csv.QUOTE_NONE:
+            self.quotechar = (dialect.quotechar or '"').encode()
+
+        # Offsets of every [stride]th row and the end of the last indexed row
+        self.checkpoints = array('Q', [0, 0])
+        self.indexed = 0
+        self.quotes = 0
+        self.file_rows = 0
+        self.file_columns = 0
+        self.added_columns = 0
+        self.parsed_rows = 0
+
+        self.groups = OrderedDict()
+        self.overlay = {}
+        self.column_ids = []
+        self.widths = []
+        self.empty = []
+        self.column_count = 0
+        self.row_count = 0
+        self.rows = RowIndex(0)
+        self.slot_count = 0
+
+    def index_chunk(self):
+        """
+        Indexes the next chunk of the file and adds its rows to the table.
+        Returns False when the whole file has been indexed.
+        """
+        row_ends = self.scan_chunk()
+        if row_ends is None:
+            return False
+        self.add_chunk(row_ends)
+        return self.indexed < len(self.data)
+
+    def scan_chunk(self):
+        """
+        Reads the next chunk of the file and returns the offsets
+        of the ends of the rows in it, or None when the whole file has been read.
+        The table itself is not changed, so this can run while it is being used.
+        """
+        size = len(self.data)
+        if self.indexed >= size:
+            return None
+        # The chunks are read instead of sliced from the map,
+        # so indexing does not keep the pages of the file in memory
+        start = self.indexed
+        chunk = os.pread(self.file.fileno(), chunk_size, start)
+        end = chunk.rfind(b'\n') + 1
+        if start + len(chunk) >= size:
+            end = len(chunk)
+        elif end == 0:
+            # A single line is longer than the chunk
+            end = self.data.find(b'\n', start + len(chunk)) + 1 - start
+            if end <= 0:
+                end = size - start
+            chunk = os.pread(self.file.fileno(), end, start)
+        self.indexed = start + end
+
+        row_ends, self.quotes = self.find_row_ends(chunk[:end], start, self.quotes)
+        return row_ends
+
+    def find_row_ends(self, chunk: bytes, start: int, quotes: int):
+        """
+        Returns the offsets of the ends of the rows in a chunk of the file
+        that starts at [start] after [quotes] quotes, and the number
+        of quotes that are still open at its end
+        """
+        # A line break ends a row when the number of quotes before it is even
+        lines = chunk.split(b'\n')[:-1]
+        line_ends = accumulate(map(len, lines), lambda position, length: position + length + 1,
+                               initial=start)
+        next(line_ends)
+        if self.quotechar is None:
+            # Every line break ends a row
+            return list(line_ends), 0
+        quotes = list(accumulate(map(methodcaller("count", self.quotechar), lines),
+                                 initial=quotes))
+        return list(compress(line_ends, map(not_, map((2).__rmod__, quotes[1:])))), quotes[-1] % 2
+
+    def row_offset(self, slot: int):
+        """Returns the offset of the start of a row of the file in it"""
+        group, row = divmod(slot, stride)
+        start = self.checkpoints[group]
+        if row == 0:
+            return start
+        chunk = self.data[start:self.checkpoints[group + 1]]
+        row_ends, _ = self.find_row_ends(chunk, start, 0)
+        if row <= len(row_ends):
+            return row_ends[row - 1]
+        # The last row of the file does not end with a line break
+        return self.checkpoints[group + 1]
+
+    def row_offsets(self):
+        """
+        Returns the offsets of the starts of all the rows of the file in it,
+        followed by the end of the last row
+        """
+        offsets = array('Q')
+        # Many groups are split at once, they all start at the start of a row
+        groups = len(self.checkpoints) - 1
+        for group in range(0, groups, 1024):
+            start = self.checkpoints[group]
+            stop = self.checkpoints[min(group + 1024, groups)]
+            row_ends, _ = self.find_row_ends(self.data[start:stop], start, 0)
+            offsets.append(start)
+            offsets.extend(row_ends)
+        # The last row of the file might not end with a line break
+        del offsets[self.file_rows:]
+        offsets.append(self.checkpoints[-1])
+        return offsets
+
+    def add_chunk(self, row_ends: list):
+        """Adds the rows of a chunk that was read by scan_chunk to the table"""
+        size = len(self.data)
+        if row_ends and not self.file_rows:
+            # Rows written by the csv writer end like the rows of the file
+            first_end = row_ends[0]
+            self.dialect.lineterminator = "\r\n" if self.data[first_end - 2:first_end - 1] == b"\r" else "\n"
+        new_rows = len(row_ends)
+        last_end = self.checkpoints.pop()
+        self.checkpoints.extend(row_ends[(-self.file_rows - 1) % stride::stride])
+        if row_ends:
+            last_end = row_ends[-1]
+        if self.indexed >= size and last_end < size:
+            # The last row does not end with a line break
+            new_rows += 1
+            last_end = size
+        self.checkpoints.append(last_end)
+
+        # The last group that was parsed might have been incomplete
+        self.groups.pop(self.file_rows // stride, None)
+        self.rows.insert(self.row_count, range(self.slot_count, self.slot_count + new_rows))
+        self.file_rows += new_rows
+        self.slot_count += new_rows
+        self.row_count += new_rows
+
+    def get_group(self, group: int):
+        """Returns the parsed rows of a group of [stride] rows of the file"""
+        if group in self.groups:
+            self.groups.move_to_end(group)
+            return self.groups[group]
+        if group + 1 >= len(self.checkpoints):
+            return []
+        text = self.data[self.checkpoints[group]:self.checkpoints[group + 1]].decode("utf-8")
+        rows = [[None if value == "" else value for value in row]
+                for row in csv.reader(io.StringIO(text, newline=None), self.dialect)]
+        for _ in range(self.file_columns, max(map(len, rows), default=0)):
+            self.add_file_column()
+        columns = list(zip_longest(*rows))
+        for index, column_id in enumerate(self.column_ids):
+            if column_id < 0:
+                continue
+            values = [value for value in columns[column_id] if value is not None] if column_id < len(columns) else []
+            if values:
+                self.widths[index] = max(self.widths[index], max(map(len, map(str, values))))
+            if len(values) < len(rows):
+                self.empty[index] = True
+        self.parsed_rows += len(rows)
+        self.groups[group] = rows
+        if len(self.groups) > cached_groups:
+            self.groups.popitem(last=False)
+        return rows
+
+    def add_file_column(self):
+        """Adds a column for the values of the file's rows that are wider than the table"""
+        self.column_ids.append(self.file_columns)
+        self.widths.append(0)
+        # The rows that were parsed before did not have this column
+        self.empty.append(self.parsed_rows > 0)
+        self.file_columns += 1
+        self.column_count += 1
+
+    def get_cell(self, column, row: int):
+        """Returns the value stored in a cell"""
+        slot = self.rows[row - 1]
+        column_id = self.column_ids[tables.get_column_number(column) - 1]
+        key = (slot, column_id)
+        if key in self.overlay:
+            return self.overlay[key]
+        if slot >= self.file_rows or column_id < 0:
+            return None
+        group = self.get_group(slot // stride)
+        if slot % stride >= len(group):
+            return None
+        values = group[slot % stride]
+        if column_id < len(values):
+            return values[column_id]
+        return None
+
+    def get_rows(self, start: int, stop: int):
+        """Returns the values of the rows from [start] up to, but not including, [stop]"""
+        return self.get_slot_rows(self.rows.slots(start - 1, stop - 1))
+
+    def get_column_values(self, column, start: int, stop: int):
+        """Returns the values of a column in the rows from [start] up to, but not including, [stop]"""
+        column_id = self.column_ids[tables.get_column_number(column) - 1]
+        slots = self.rows.slots(start - 1, stop - 1)
+        if isinstance(slots, range):
+            indices = range(len(slots))
+        else:
+            # The rows are read in the order of the file, so every group is parsed once
+            indices = sorted(range(len(slots)), key=slots.__getitem__)
+        values = [None] * len(slots)
+        number = None
+        group = []
+        for index in indices:
+            slot = slots[index]
+            key = (slot, column_id)
+            if key in self.overlay:
+                values[index] = self.overlay[key]
+                continue
+            if slot >= self.file_rows or column_id < 0:
+                continue
+            if slot // stride != number:
+                number = slot // stride
+                group = self.get_group(number)
+            if slot % stride < len(group) and column_id < len(group[slot % stride]):
+                values[index] = group[slot % stride][column_id]
+        return values
+
+    def get_slot_rows(self, slots):
+        """Returns the values of the rows held in given slots"""
+        rows = []
+        number = None
+        group = []
+        for slot in slots:
+            values = []
+            if slot < self.file_rows:
+                if slot // stride != number:
+                    number = slot // stride
+                    group = self.get_group(number)
+                if slot % stride < len(group):
+                    values = group[slot % stride]
+            rows.append((slot, values))
+
+        if not self.overlay and self.column_ids == list(range(self.column_count)):
+            # The columns are the ones of the file and no cell was edited,
+            # the last columns of the file might have been removed
+            padding = [None] * self.column_count
+            return [(values + padding)[:self.column_count] for _, values in rows]
+        return [[self.overlay.get((slot, column_id),
+                                  values[column_id] if 0 <= column_id < len(values) else None)
+                 for column_id in self.column_ids]
+                for slot, values in rows]
+
+    def write_rows(self, file):
+        """
+        Writes the rows of the table as csv to an open binary file.
+        Runs of rows that were not changed since the file was opened
+        are copied from it as they are, keeping their quoting and line breaks,
+        only the changed and added rows are written by the csv writer.
+        """
+        if self.column_ids != list(range(self.file_columns)):
+            # Columns were added or removed, so every row has changed
+            super().write_rows(file)
+            return
+
+        text = io.StringIO()
+        writer = csv.writer(text, dialect=self.dialect)
+        changed = sorted({slot for slot, _ in self.overlay})
+        line_break = True
+        # Offsets of all the rows, found once the rows were copied out of order more times
+        # than there are groups in the file, so that copying a row does not split its group
+        offsets = None
+        copies = 0
+
+        def copy(start: int, stop: int):
+            # Copies the rows of the file held in slots [start, stop)
+            nonlocal line_break, offsets, copies
+            if start >= stop:
+                return
+            if not line_break:
+                file.write(self.dialect.lineterminator.encode())
+            copies += 1
+            if offsets is None and copies > len(self.checkpoints):
+                offsets = self.row_offsets()
+            if offsets is not None:
+                position, end = offsets[start], offsets[stop]
+            else:
+                position = self.row_offset(start)
+                end = self.row_offset(stop) if stop < self.file_rows else self.checkpoints[-1]
+            while position < end:
+                data = os.pread(self.file.fileno(), min(chunk_size, end - position), position)
+                file.write(data)
+                position += len(data)
+            line_break = self.data[end - 1:end] == b'\n'
+
+        def encode(slots):
+            # Writes the rows held in given slots with the csv writer
+            nonlocal line_break
+            if not line_break:
+                file.write(self.dialect.lineterminator.encode())
+            for batch in range(0, len(slots), tables.batch_size):
+                writer.writerows(self.get_slot_rows(slots[batch:batch + tables.batch_size]))
+                file.write(text.getvalue().encode("utf-8"))
+                text.seek(0)
+                text.truncate()
+            line_break = True
+
+        for run in self.rows.runs():
+            file_run = range(run.start, min(run.stop, max(self.file_rows, run.start)))
+            start = file_run.start
+            for slot in changed[bisect_left(changed, file_run.start):bisect_left(changed, file_run.stop)]:
+                copy(start, slot)
+                encode([slot])
+                start = slot + 1
+            copy(start, file_run.stop)
+            if file_run.stop < run.stop:
+                encode(run[len(file_run):])
+
+    def set_cell(self, column, row: int, value):
+        """Sets the value of a cell"""
+        column_index = tables.get_column_number(column) - 1
+        self.overlay[(self.rows[row - 1], self.column_ids[column_index])] = value
+        if value is None:
+            self.empty[column_index] = True
+        else:
+            self.widths[column_index] = max(self.widths[column_index], len(str(value)))
+
+    def insert_column(self, column_index: int, column: tuple = None):
+        """
+        Inserts an empty column in the table at a given index,
+        or a column that was removed from it before
+        """
+        if column is None:
+            # Columns that are not in the file have negative ids
+            self.added_columns += 1
+            column = (-self.added_columns, 0, True, {})
+        column_id, width, empty, values = column
+        self.column_ids.insert(column_index, column_id)
+        self.widths.insert(column_index, width)
+        self.empty.insert(column_index, empty)
+        self.overlay.update(values)
+        self.column_count += 1
+
+    def insert_row(self, row_index: int, row: tuple = None):
+        """
+        Inserts an empty row in the table at a given index,
+        or a row that was removed from it before
+        """
+        if row is None:
+            self.insert_rows(row_index, 1)
+            return
+        slot, values = row
+        self.rows.insert(row_index, [slot])
+        self.overlay.update(values)
+        self.row_count += 1
+
+    def insert_rows(self, row_index: int, count: int):
+        """Inserts [count] empty rows in the table at a given index"""
+        self.rows.insert(row_index, range(self.slot_count, self.slot_count + count))
+        self.slot_count += count
+        self.row_count += count
+
+    def extend_rows(self, rows: list):
+        """Appends rows of values to the bottom of the table"""
+        start = self.row_count
+        self.insert_rows(start, len(rows))
+        for row, values in enumerate(rows, start + 1):
+            for _ in range(self.column_count, len(values)):
+                self.insert_column(self.column_count)
+            for column, value in enumerate(values, 1):
+                self.set_cell(column, row, value)
+
+    def remove_column(self, column_index: int):
+        """
+        Removes a column from a table at a given index and returns it
+        as its id, width, whether it has empty cells and its edited cells
+        """
+        column_id = self.column_ids.pop(column_index - 1)
+        values = {key: value for key, value in self.overlay.items() if key[1] == column_id}
+        for key in values:
+            del self.overlay[key]
+        self.column_count -= 1
+        return column_id, self.widths.pop(column_index - 1), self.empty.pop(column_index - 1), values
+
+    def remove_row(self, row_index: int):
+        """
+        Removes a row from a table at a given index and returns it
+        as the slot that held it and its edited cells
+        """
+        slot = self.rows[row_index - 1]
+        values = {key: value for key, value in self.overlay.items() if key[0] == slot}
+        self.remove_rows(row_index, row_index + 1)
+        return slot, values
+
+    def remove_rows(self, start: int, stop: int):
+        """Removes the rows from [start] up to, but not including, [stop]"""
+        slots = set(self.rows.delete(start - 1, stop - 1))
+        self.overlay = {key: value for key, value in self.overlay.items() if key[0] not in slots}
+        self.row_count -= len(slots)
+
+    def get_aggregates(self, column):
+        """Lazy tables have no aggregates, finding them would mean reading the whole file"""
+        return None
+
+    def get_search_index(self, column):
+        """Lazy tables are not indexed, their rows are read when they are searched"""
+        return None
+
+    def column_is_empty(self, column):
+        # Checking a column of the file would mean reading all of it,
+        # so only the columns that were added in the editor can be empty
+        column_id = self.column_ids[tables.get_column_number(column) - 1]
+        if column_id >= 0:
+            return False
+        return all(value in (None, "") for key, value in self.overlay.items()
+                   if key[1] == column_id)
+
+    def max_len(self, column):
+        """Returns the maximum length of the values of a column that were read so far"""
+        column_index = tables.get_column_number(column) - 1
+        longest = max(self.widths[column_index], 1)
+        if self.empty[column_index]:
+            # Empty cells are measured by their text representation
+            longest = max(longest, len(str(None)))
+        return longest
+
+def can_index(dialect):
+    """
+    Returns True if the rows of the files of a dialect can be found by counting quotes,
+    quotes that are escaped by another character cannot be told apart from the other ones
+    """
+    return not dialect.escapechar and dialect.doublequote
+
+def file_open(file_name):
+    """
+    Opens a csv file as a lazy table object,
+    or as a table that holds all of it if its rows can not be indexed
+    """
+    with open(file_name, encoding="utf-8") as file:
+        dialect = tables.sniff_dialect(file)
+    if not can_index(dialect):
+        return tables.file_open(file_name)
+    return_table = LazyTable(file_name, dialect)
+    while return_table.index_chunk():
+        pass
+    return_table.get_group(0)
+    return return_table
+
+def file_load(file_name):
+    """
+    Opens a csv file as a lazy table object with only its first chunk indexed,
+    and starts a loader that indexes the rest of it. Files whose rows can not
+    be indexed are loaded as tables that hold all of them (see tables.file_load).
+    """
+    with open(file_name, encoding="utf-8") as file:
+        dialect = tables.sniff_dialect(file)
+    if not can_index(dialect):
+        return tables.file_load(file_name)
+    return_table = LazyTable(file_name, dialect)
+    return_table.index_chunk()
+    return_table.get_group(0)
+
+    def chunks():
+        while (row_ends := return_table.scan_chunk()) is not None:
+            yield row_ends, return_table.indexed
+
+    loader = Loader(chunks(), return_table.add_chunk, len(return_table.data))
+    loader.start()
+    return return_table, loader
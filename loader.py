@@ -0,0 +1,44 @@
+"""
+This module is a part of CSVEdit.
+It contains a "Loader" class that fills a table from a file in the background,
+so the editor can be used while the file is still being loaded.
+"""
+import time
+import threading
+
+class Loader(threading.Thread):
+    """
+    A thread that adds the parts of a file to a table.
+    [parts] yields a part of the file and the number of bytes read so far,
+    it is read and parsed without holding the lock, and only [add_part]
+    that adds it to the table holds it. The editor holds the same lock
+    while it uses the table, so it never sees a part that is half added.
+    """
+    def __init__(self, parts, add_part, size: int):
+        super().__init__(daemon=True)
+        self.parts = parts
+        self.add_part = add_part
+        self.size = size
+        self.position = 0
+        self.error = None
+        # The time the last part was added at, once all of them were
+        self.finish_time = None
+        self.lock = threading.Lock()
+
+    def run(self):
+        try:
+            for part, position in self.parts:
+                with self.lock:
+                    self.add_part(part)
+                    self.position = position
+        except Exception as exception:
+            # The editor reports the error once it notices the loader has stopped
+            self.error = exception
+            return
+        self.finish_time = time.perf_counter()
+
+    def progress(self):
+        """Returns the percentage of the file that has been loaded"""
+        if not self.size:
+            return 100
+        return min(self.position * 100 // self.size, 100)
@@ -0,0 +1,141 @@
+"""
+This module is a part of CSVEdit.
+It contains a "Profiler" class that records the time the editor takes
+to handle keys, to draw its panels and to read and write files.
+"""
+import os
+import json
+import time
+from array import array
+
+def percentile(samples, fraction: float):
+    """Returns the sample below which a given fraction of the samples lie"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+def summarize(samples):
+    """Returns the count, the total, the mean, the median, the 95th percentile and the maximum of samples"""
+    total = sum(samples)
+    return {"count": len(samples),
+            "total": total,
+            "mean": total / len(samples) if samples else 0.0,
+            "p50": percentile(samples, 0.5),
+            "p95": percentile(samples, 0.95),
+            "max": max(samples, default=0.0)}
+
+def get_key_name(key: int):
+    """Returns the character of a key, or its code if it is not printable"""
+    return chr(key) if 32 < key < 127 else str(key)
+
+class Profiler:
+    """
+    Times of the frames the editor draws after every key and of the stages
+    they are made of, kept as arrays of seconds, and the times taken by
+    reading and writing files. The editor only times anything when it was
+    given a profiler, so there is no cost when profiling is off.
+    """
+    def __init__(self, overlay: bool = False):
+        # Creates a profiler, [overlay] shows the time of the last frame on the screen
+        self.overlay = overlay
+        self.frames = array('d')
+        self.keys = {}
+        self.stages = {}
+        self.files = []
+        self.loader = None
+        self.frame_start = None
+        # Time spent waiting for input during the current frame
+        self.waiting = 0.0
+
+    def timed(self, name: str, function):
+        """Returns a function that calls a given one and records its run time as a stage"""
+        samples = self.stages.setdefault(name, array('d'))
+        clock = time.perf_counter
+
+        def timed_function(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                samples.append(clock() - start)
+
+        return timed_function
+
+    def waited(self, function):
+        """Returns a function that calls a given one that waits for input, leaving its run time out of the frame"""
+        clock = time.perf_counter
+
+        def waiting_function(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.waiting += clock() - start
+
+        return waiting_function
+
+    def start_frame(self):
+        """Starts timing the frame drawn after a key"""
+        self.frame_start = time.perf_counter()
+        self.waiting = 0.0
+
+    def end_frame(self, key: int):
+        """Records the time taken by handling a key and drawing the result"""
+        seconds = time.perf_counter() - self.frame_start - self.waiting
+        self.frames.append(seconds)
+        self.keys.setdefault(key, array('d')).append(seconds)
+
+    def record_file(self, operation: str, file_name: str, seconds: float, size: int):
+        """Records the time taken by reading or writing a file of a given size in bytes"""
+        self.files.append({"operation": operation,
+                           "file": file_name,
+                           "seconds": seconds,
+                           "bytes": size,
+                           "mb_per_second": size / max(seconds, 1e-9) / 2 ** 20})
+
+    def watch_loader(self, loader, file_name: str, start: float):
+        """Notes a loader that started reading a file at [start], it is timed once it finishes"""
+        self.loader = (loader, file_name, start)
+
+    def check_loader(self):
+        """Records the time taken by the loader once it has finished"""
+        if self.loader is None or self.loader[0].finish_time is None:
+            return
+        loader, file_name, start = self.loader
+        self.loader = None
+        self.record_file("file_open", file_name, loader.finish_time - start, loader.size)
+
+    def overlay_text(self):
+        """Returns the time of the last frame and the 95th percentile of all of them"""
+        if not self.frames:
+            return ""
+        return f"frame {self.frames[-1] * 1000:.1f} ms  p95 {percentile(self.frames, 0.95) * 1000:.1f} ms"
+
+    def summary(self):
+        """Returns the statistics of the frames, the keys, the stages and the files"""
+        self.check_loader()
+        return {"frames": summarize(self.frames),
+                "keys": {get_key_name(key): summarize(samples) for key, samples in self.keys.items()},
+                "stages": {name: summarize(samples) for name, samples in self.stages.items()},
+                "files": self.files}
+
+    def write(self, file_name: str):
+        """Writes the statistics to a file, as json if its name ends with .json and as a log otherwise"""
+        summary = self.summary()
+        with open(file_name, "w", encoding="utf-8") as file:
+            if os.path.splitext(file_name)[1].lower() == ".json":
+                json.dump(summary, file, indent=2)
+                return
+            file.write(f"Profile of {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+            rows = [("frames", summary["frames"]),
+                    *((f"key {name}", stats) for name, stats in summary["keys"].items()),
+                    *summary["stages"].items()]
+            for name, stats in rows:
+                file.write(f"{name:<20} {stats['count']:>7} x  mean {stats['mean'] * 1000:9.3f} ms  "
+                           f"p50 {stats['p50'] * 1000:9.3f} ms  p95 {stats['p95'] * 1000:9.3f} ms  "
+                           f"max {stats['max'] * 1000:9.3f} ms  total {stats['total']:8.3f} s\n")
+            for entry in summary["files"]:
+                file.write(f"{entry['operation']:<20} {entry['seconds']:8.3f} s  "
+                           f"{entry['bytes'] / 2 ** 20:9.1f} MB  {entry['mb_per_second']:8.1f} MB/s  "
+                           f"{entry['file']}\n")
@@ -1,50 +1,145 @@
+import io
 import csv
 import re
+from functools import lru_cache
+from itertools import chain
 
-def sniff_quoting(file_name, dialect = None, quotechar = None, delimiter = None):
-    quoted_values = []
-    cells = []
+# Number of lines that are read before the quoted values in them are counted
+# Default: 1024
+scan_lines = 1024
 
+@lru_cache
+def get_pattern(quotechar):
+    """Returns a compiled pattern that matches values enclosed in [quotechar]"""
+    quotechar = re.escape(quotechar)
+    return re.compile(rf"{quotechar}([^{quotechar}]+){quotechar}")
+
+@lru_cache
+def get_escape_pattern(escapechar, quotechar):
+    """Returns a compiled pattern that matches characters escaped by [escapechar] and quotes that are not"""
+    return re.compile(rf"{re.escape(escapechar)}(.)|{re.escape(quotechar)}", re.DOTALL)
+
+def count_values(text, dialect, **parameters):
+    """
+    Returns the different numbers of values in the rows of a sample of csv data,
+    or None if it can not be read. The last row is left out when the sample cuts it off.
+    """
+    try:
+        rows = list(csv.reader(io.StringIO(text, newline=""), dialect, **parameters))
+    except csv.Error:
+        return None
+    if len(rows) > 1 and not text.endswith(("\n", "\r")):
+        rows.pop()
+    return {len(row) for row in rows}
+
+def sniff_escapechar(text, dialect, escapechar = "\\"):
+    """
+    Returns [escapechar] if it escapes the quotes in a sample of csv data
+    instead of values being quoted, or None otherwise. The sample must have
+    escaped quotes, no other quotes, and rows of the same number of values
+    only when it is read with the escapes.
+    """
+    quotechar = dialect.quotechar or '"'
+    escaped_quote = False
+    for match in get_escape_pattern(escapechar, quotechar).finditer(text):
+        character = match.group(1)
+        if character is None:
+            return None
+        if character == quotechar:
+            escaped_quote = True
+    if not escaped_quote:
+        return None
+    escaped = count_values(text, dialect, quoting=csv.QUOTE_NONE, escapechar=escapechar, doublequote=False)
+    plain = count_values(text, dialect, escapechar=None, doublequote=True)
+    if escaped is None or len(escaped) != 1 or (plain is not None and len(plain) == 1):
+        return None
+    return escapechar
+
+def sniff_quoting(file_name, dialect = None, quotechar = None, delimiter = None,
+                  max_size = None, max_rows = None):
     with open(file_name, encoding="utf-8") as file:
-        if not dialect:
-            if not delimiter:
-                dialect = csv.Sniffer().sniff(file.readline())
-            else:
-                dialect = csv.Sniffer().sniff(file.readline(), delimiters=delimiter)
-        if not quotechar:
-            quotechar = dialect.quotechar
+        return sniff_quoting_lines(file, dialect, quotechar, delimiter, max_size, max_rows)
+
+def sniff_quoting_lines(lines, dialect = None, quotechar = None, delimiter = None,
+                        max_size = None, max_rows = None):
+    """
+    Determines the quoting of csv data read from an iterable of lines.
+    By default all the lines are read. When [max_size] (in characters)
+    or [max_rows] is given, only a sample of that size is read, and
+    reading stops early once the sample rules out every quoting
+    but QUOTE_MINIMAL or QUOTE_NONE.
+    """
+    lines = iter(lines)
+    if not dialect:
+        first_line = next(lines, '')
+        lines = chain([first_line], lines)
         if not delimiter:
-            delimiter = dialect.delimiter
-
-        file.seek(0)
-        file_reader = csv.reader(file, dialect, delimiter=delimiter)
-        for row in file_reader:
-            for value in row:
-                cells.append(value)
-
-        file.seek(0)
-        pattern = rf"{quotechar}([^{quotechar}]+){quotechar}"
-        text = file.read()
-        quoted_values = re.findall(pattern, text)
-        with_delimiter = 0
-        non_numeric = 0
-        other = 0
-        for value in quoted_values:
-            if delimiter in value and not str(value).isdigit():
-                with_delimiter += 1
-                non_numeric += 1
-            elif delimiter in value:
+            dialect = csv.Sniffer().sniff(first_line)
+        else:
+            dialect = csv.Sniffer().sniff(first_line, delimiters=delimiter)
+    if not quotechar:
+        quotechar = dialect.quotechar
+    if not delimiter:
+        delimiter = dialect.delimiter
+
+    pattern = get_pattern(quotechar)
+    sampling = max_size is not None or max_rows is not None
+    pending_lines = []
+    size = 0
+    cells = 0
+    quoted = 0
+    with_delimiter = 0
+    non_numeric = 0
+
+    def read_lines():
+        nonlocal size
+        for line in lines:
+            pending_lines.append(line)
+            size += len(line)
+            yield line
+
+    def count_quoted(text):
+        # Counts the quoted values in the text and returns the part of it
+        # that starts with a quote that might be closed in the following text
+        nonlocal quoted, with_delimiter, non_numeric
+        end = 0
+        for match in pattern.finditer(text):
+            value = match.group(1)
+            quoted += 1
+            # Values with line breaks or doubled quotes have to be quoted as well
+            if (delimiter in value or "\n" in value or "\r" in value
+                    or text.startswith(quotechar, match.end())
+                    or text.endswith(quotechar, 0, match.start())):
                 with_delimiter += 1
-            elif not str(value).isdigit():
+            if not value.isdigit():
                 non_numeric += 1
-            else:
-                other += 1
+            end = match.end()
+        last_quote = text.rfind(quotechar, end)
+        if last_quote == -1:
+            return ''
+        return text[last_quote:]
+
+    unfinished = ''
+    file_reader = csv.reader(read_lines(), dialect, delimiter=delimiter)
+    for rows, row in enumerate(file_reader, 1):
+        cells += len(row)
+        out_of_budget = ((max_size is not None and size >= max_size)
+                         or (max_rows is not None and rows >= max_rows))
+        if len(pending_lines) >= scan_lines or out_of_budget:
+            unfinished = count_quoted(unfinished + ''.join(pending_lines))
+            pending_lines.clear()
+            if sampling and (out_of_budget or (cells > quoted
+                                               and with_delimiter < quoted
+                                               and non_numeric < quoted)):
+                break
+    count_quoted(unfinished + ''.join(pending_lines))
 
-    if len(cells) == len(quoted_values):
+    # Values with doubled quotes can be counted more than once
+    if quoted >= cells:
         return csv.QUOTE_ALL
-    if len(quoted_values) == with_delimiter and len(quoted_values) != 0:
+    if quoted == with_delimiter and quoted != 0:
         return csv.QUOTE_MINIMAL
-    if len(quoted_values) == non_numeric and len(quoted_values) != 0:
+    if quoted == non_numeric and quoted != 0:
         return csv.QUOTE_NONNUMERIC
     if dialect.escapechar:
         return csv.QUOTE_NONE
@@ -0,0 +1,248 @@
+"""
+This module is a part of CSVEdit.
+It contains a "Frame" class that holds the lines shown on the screen,
+and functions that lay out the panels of the editor in a frame,
+so frames can be composed and compared without a terminal.
+"""
+import re
+from collections import OrderedDict
+
+# Attributes of the characters of a frame, they can be combined
+NORMAL = 0
+REVERSE = 1
+UNDERLINE = 2
+BLINK = 4
+
+# Number of laid out rows that are kept, so rows that are shown again are not laid out again
+# Default: 4096
+cache_size = 4096
+
+# Finds the runs of characters that have the same attribute
+RUN = re.compile(r"(.)\1*", re.DOTALL)
+
+class Frame:
+    """
+    The lines of a screen of a given size, as strings of their characters
+    and strings of the attributes of the characters, one character each.
+    Text is cut off at the edges of the frame, so panels can be laid out
+    without checking if they fit on the screen.
+    """
+    def __init__(self, height: int, width: int):
+        # Creates a frame filled with spaces
+        self.height = height
+        self.width = width
+        self.lines = [" " * width] * height
+        self.attributes = [chr(NORMAL) * width] * height
+
+    def write(self, y: int, x: int, text: str, attributes: str, right: int = None):
+        """
+        Writes text with the attributes of its characters starting at a position,
+        up to, but not including, column [right]
+        """
+        right = self.width if right is None else min(right, self.width)
+        if not 0 <= y < self.height or x >= right:
+            return
+        if x < 0:
+            text = text[-x:]
+            attributes = attributes[-x:]
+            x = 0
+        text = text[:right - x]
+        end = x + len(text)
+        line = self.lines[y]
+        self.lines[y] = line[:x] + text + line[end:]
+        line = self.attributes[y]
+        self.attributes[y] = line[:x] + attributes[:len(text)] + line[end:]
+
+    def put(self, y: int, x: int, text: str, attribute: int = NORMAL, right: int = None):
+        """Writes text with the same attribute starting at a position, up to, but not including, column [right]"""
+        self.write(y, x, text, chr(attribute) * len(text), right)
+
+    def fill(self, top: int, bottom: int, left: int, right: int, attribute: int = NORMAL):
+        """Fills the lines from [top] up to [bottom] and the columns from [left] up to [right] with spaces"""
+        spaces = " " * max(right - left, 0)
+        for y in range(max(top, 0), min(bottom, self.height)):
+            self.put(y, left, spaces, attribute, right)
+
+    def runs(self, y: int):
+        """Yields the position, the text and the attribute of the runs of characters of a line that look the same"""
+        line = self.lines[y]
+        for run in RUN.finditer(self.attributes[y]):
+            yield run.start(), line[run.start():run.end()], ord(run.group(1))
+
+    def text(self):
+        """Returns the characters of the frame as lines of text"""
+        return "\n".join(self.lines)
+
+def table_height(frame: Frame):
+    """Returns the number of rows of the table that fit in a frame"""
+    return frame.height - 3
+
+def visible_columns(table, x_shift: int, row_width: int, width: int, max_cell_length: int):
+    """Returns the numbers and display widths of the columns of a table that fit on the screen"""
+    columns = []
+    x_display = 0
+    for x in range(x_shift, table.column_count):
+        if x_display >= width - row_width - 1:
+            break
+        column_len = min(table.max_len(x + 1), max_cell_length)
+        columns.append((x + 1, column_len))
+        x_display += column_len + 3
+    return columns
+
+def format_cell(value, column_len: int, max_cell_length: int):
+    """Returns the text of a cell centered in a column of a given width"""
+    if value is None or value == '':
+        value = "-"
+    value = str(value).strip()
+    if len(value) > max_cell_length:
+        value = value[:max_cell_length - 3] + "..."
+    return f" {value:^{column_len}} "
+
+def row_text(table, columns: tuple, row: int, max_cell_length: int):
+    """Returns the cells of a row of a table in given columns, each one followed by a separator"""
+    return "".join([format_cell(table.get_cell(x, row), column_len, max_cell_length)[:column_len + 2] + "|"
+                    for x, column_len in columns])
+
+class CellCache:
+    """
+    The texts of the rows of a table as they are shown in given columns.
+    The text of a row is kept with the columns it was laid out in, and it is
+    laid out again when other columns are shown. A row is looked up once,
+    not each of its cells, so rows that are not kept cost little more than
+    laying them out. At most [size] texts are kept, and the ones that were
+    used the longest time ago are dropped. The texts of rows with cells that
+    are changed have to be dropped with forget(), and all of them with clear()
+    when rows or columns are added, removed or moved.
+    """
+    def __init__(self, size: int = None):
+        # Creates an empty cache of [size] texts (default: cache_size)
+        self.size = cache_size if size is None else size
+        self.texts = OrderedDict()
+
+    def get(self, table, columns: tuple, row: int, max_cell_length: int):
+        """Returns the cells of a row of a table in given columns (see row_text)"""
+        entry = self.texts.get(row)
+        if entry is not None and entry[0] == columns:
+            self.texts.move_to_end(row)
+            return entry[1]
+        text = row_text(table, columns, row, max_cell_length)
+        self.texts[row] = (columns, text)
+        if entry is not None:
+            # New texts are added at the end, replaced ones are moved there
+            self.texts.move_to_end(row)
+        elif len(self.texts) > self.size:
+            self.texts.popitem(last=False)
+        return text
+
+    def forget(self, column_number: int, row: int):
+        """Drops the text of the row of a cell that was changed"""
+        self.texts.pop(row, None)
+
+    def clear(self):
+        """Drops the texts of all the rows"""
+        self.texts.clear()
+
+def draw_table(frame: Frame, table, columns: list, rows: range, row_width: int,
+               max_cell_length: int, cell_attribute, cache: CellCache = None):
+    """
+    Lays out the cells of given columns and rows of a table right of the row numbers,
+    cell_attribute(column_number, row) returns the attribute of a cell,
+    and the texts of the rows are taken from a cache when one is given
+    """
+    frame.fill(1, table_height(frame) + 1, row_width, frame.width - 1)
+    columns = tuple(columns)
+    for y, row in enumerate(rows, 1):
+        # The cells of a row are joined and written at once
+        if cache is None:
+            text = row_text(table, columns, row, max_cell_length)
+        else:
+            text = cache.get(table, columns, row, max_cell_length)
+        attributes = "".join([chr(cell_attribute(x, row)) * (column_len + 2) + chr(NORMAL)
+                              for x, column_len in columns])
+        frame.write(y, row_width, text, attributes, frame.width - 1)
+
+def draw_cell(frame: Frame, table, column_number: int, row: int, y_shift: int, x_display: int,
+              column_len: int, row_width: int, max_cell_length: int, attribute: int):
+    """Lays out a single cell of a table that starts [x_display] characters right of the row numbers"""
+    text = format_cell(table.get_cell(column_number, row), column_len, max_cell_length)
+    frame.put(row - y_shift, row_width + x_display, text, attribute, frame.width - 1)
+
+def draw_header(frame: Frame, columns: list, row_width: int, get_name):
+    """Lays out the names of given columns above the table, get_name(column_number) returns a name"""
+    frame.fill(0, 1, row_width, frame.width - 1, REVERSE)
+    frame.put(0, row_width, "".join(f" {str(get_name(x)):^{column_len}} |" for x, column_len in columns),
+              REVERSE, frame.width - 1)
+
+def draw_row_numbers(frame: Frame, numbers: list, row_width: int):
+    """Lays out the numbers of the rows of the table left of it, the rest of the lines are left empty"""
+    for y in range(table_height(frame)):
+        number = numbers[y] if y < len(numbers) else ' '
+        frame.put(y + 1, 0, f"{number:^{row_width}}", REVERSE, row_width)
+
+def draw_corner(frame: Frame, row_width: int, x_shift: int, y_shift: int):
+    """Lays out the mark above the row numbers that shows which way the table was scrolled"""
+    if x_shift > 0 and y_shift > 0:
+        mark = 'X'
+    elif x_shift > 0:
+        mark = '<'
+    elif y_shift > 0:
+        mark = '^'
+    else:
+        mark = ' '
+    frame.put(0, 0, f"{mark:^{row_width}}", REVERSE, row_width)
+
+def draw_more_rows(frame: Frame, row_width: int, more: bool):
+    """Lays out the mark below the row numbers that shows that there are rows below the screen"""
+    frame.put(frame.height - 2, 0, f"{'V' if more else ' ':^{row_width}}", REVERSE, row_width)
+
+def draw_more_columns(frame: Frame, more: bool):
+    """Lays out the mark right of the column names that shows that there are columns right of the screen"""
+    frame.put(0, frame.width - 1, ">" if more else " ", REVERSE)
+
+def info_text(message: str, aggregates: str, show_mode: bool, row_width: int, width: int):
+    """Returns the text of the info line: the message, then the aggregates if they fit and the mode label"""
+    if show_mode:
+        if aggregates and len(message) + len(aggregates) + 2 + len(" Mode:") + row_width < width - 2:
+            message = f"{message}  {aggregates}"
+        spacer_len = (width - 2) - (len(message) + len(" Mode:") + row_width)
+        if spacer_len > 0:
+            message = f"{message}{' ':^{spacer_len}} Mode:"
+    if len(message) >= width - 1:
+        message = ' '
+    return message
+
+def draw_info(frame: Frame, message: str, aggregates: str, show_mode: bool, row_width: int):
+    """Lays out the info line below the table"""
+    message = info_text(message, aggregates, show_mode, row_width, frame.width)
+    frame.put(frame.height - 2, row_width, f"{message:<{frame.width - row_width - 1}}",
+              REVERSE, frame.width - 1)
+
+def input_width(frame: Frame, address: str):
+    """Returns the width of the input line left of the address of the pointer"""
+    return frame.width - 2 - len(address)
+
+def draw_input(frame: Frame, value, address: str):
+    """Lays out the value of the cell under the pointer on the last line"""
+    input_length = input_width(frame, address)
+    value = f"> {value}"
+    if len(value) > input_length:
+        value = value[:input_length - 3] + "..."
+    frame.put(frame.height - 1, 0, f"{value:<{input_length + 1}}", NORMAL, input_length + 1)
+
+def draw_address(frame: Frame, address: str):
+    """Lays out the address of the pointer at the end of the last line"""
+    frame.put(frame.height - 1, frame.width - len(address), address, REVERSE)
+
+def draw_indicator(frame: Frame, indicators: str, mode: str, read_only: bool):
+    """
+    Lays out the indicators (alert, quoting and loading progress) down
+    the right edge of the table, and the mode of the editor below them
+    """
+    x = frame.width - 1
+    indicators = f"{indicators:<{table_height(frame)}}"[:table_height(frame)]
+    for y, symbol in enumerate(indicators, 1):
+        frame.put(y, x, symbol, REVERSE)
+    if read_only:
+        frame.put(frame.height - 2, x, "R", REVERSE | UNDERLINE)
+    else:
+        frame.put(frame.height - 2, x, mode, REVERSE)
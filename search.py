@@ -0,0 +1,170 @@
+"""
+This module is a part of CSVEdit.
+It contains a "SearchIndex" class that finds text in a column quickly,
+and functions that find the cells of a table that contain a text.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, islice
+
+# Number of rows after the starting cell that are read before the indexes are used,
+# so the matches that are close to it are found without building them
+# Default: 256
+scan_rows = 256
+
+# A search index is rebuilt once this many of its cells have changed or were added,
+# or more than a sixteenth of them
+# Default: 1024
+rebuild_threshold = 1024
+
+# Separates the texts of the cells in an index, values can not contain it
+SEPARATOR = "\0"
+
+def get_text(value):
+    """Returns the text a value is searched in"""
+    if value is None:
+        return ""
+    return str(value).lower()
+
+def matches(value, query: str):
+    """Returns True if the text of a value contains a query, ignoring the case"""
+    return value is not None and query in str(value).lower()
+
+class SearchIndex:
+    """
+    The texts of the cells of a column in lowercase, joined into one string
+    that is searched at once instead of cell by cell.
+    The column reports the cells that change after the index is built,
+    they are searched by their current values until there are enough
+    of them to rebuild it. Cells added to the column later are searched
+    the same way.
+    """
+    def __init__(self, column):
+        # Creates an index of a storage.Column
+        self.column = column
+        self.build()
+
+    def build(self):
+        """Reads the texts of all the cells of the column"""
+        self.size = len(self.column)
+        texts = ["" if value is None else str(value) for value in self.column.values(range(self.size))]
+        text = SEPARATOR.join(texts)
+        self.text = text.lower()
+        if len(self.text) != len(text):
+            # Some letters take more characters in lowercase, so the cells are lowered one by one
+            texts = [text.lower() for text in texts]
+            self.text = SEPARATOR.join(texts)
+        self.starts = array('Q', accumulate(map((1).__add__, map(len, texts[:-1])), initial=0))
+        self.changed = set()
+        self.cache = None
+
+    def discard(self, index: int):
+        """Marks a cell whose value has changed since the index was built"""
+        self.changed.add(index)
+        self.cache = None
+
+    def find(self, query: str):
+        """Returns the set of the indices of the cells that contain a query"""
+        outdated = len(self.changed) + len(self.column) - self.size
+        if outdated > max(rebuild_threshold, self.size // 16):
+            self.build()
+        if self.cache and self.cache[0] == (query, len(self.column)):
+            return self.cache[1]
+
+        result = set()
+        position = self.text.find(query)
+        while position >= 0:
+            index = bisect_right(self.starts, position) - 1
+            result.add(index)
+            if index + 1 >= self.size:
+                break
+            position = self.text.find(query, self.starts[index + 1])
+        result -= self.changed
+        added = range(self.size, len(self.column))
+        for index, value in zip((*self.changed, *added),
+                                self.column.values([*self.changed, *added])):
+            if matches(value, query):
+                result.add(index)
+
+        self.cache = ((query, len(self.column)), result)
+        return result
+
+def walk(table, column: int, row: int, backwards: bool = False, inclusive: bool = False):
+    """
+    Yields the column, the row and the value of the cells of a table
+    in the order they are searched in: from a given cell to the end
+    of the table going through the rows from left to right (or back
+    to its start when [backwards] is True), and then from the other end
+    back to the cell. The given cell itself comes first when [inclusive]
+    is True, and last otherwise.
+    """
+    step = -1 if backwards else 1
+    if backwards:
+        passes = [range(row, 0, -1), range(table.row_count, row - 1, -1)]
+    else:
+        passes = [range(row, table.row_count + 1), range(1, row + 1)]
+    for number, rows in enumerate(passes):
+        for start in range(0, len(rows), scan_rows):
+            part = rows[start:start + scan_rows]
+            first = min(part[0], part[-1])
+            values = table.get_rows(first, max(part[0], part[-1]) + 1)
+            for current_row in part:
+                cells = list(enumerate(values[current_row - first], 1))
+                if backwards:
+                    cells.reverse()
+                for current_column, value in cells:
+                    if current_row == row:
+                        # The row of the cell is split between the two passes
+                        offset = (current_column - column) * step
+                        if (offset > 0 or inclusive and offset == 0) != (number == 0):
+                            continue
+                    yield current_column, current_row, value
+
+def find(table, query: str, column: int, row: int,
+         backwards: bool = False, inclusive: bool = False):
+    """
+    Returns the column and the row of the first cell after a given one,
+    in the order of "walk", that contains a query.
+    Returns None when no cell contains the query.
+    """
+    query = query.lower()
+    if not query or not table.row_count:
+        return None
+
+    # The rows close to the cell are read directly
+    cells = walk(table, column, row, backwards, inclusive)
+    for current_column, current_row, value in islice(cells, scan_rows * table.column_count):
+        if matches(value, query):
+            return current_column, current_row
+
+    indexes = [table.get_search_index(number) for number in range(1, table.column_count + 1)]
+    if None in indexes:
+        # The table can not be indexed, so the rest of it is read
+        for current_column, current_row, value in cells:
+            if matches(value, query):
+                return current_column, current_row
+        return None
+
+    # Every column gives its first match after the cell,
+    # or its first match from the other end of the table
+    step = -1 if backwards else 1
+    best = None
+    for number, index in enumerate(indexes, 1):
+        found_rows = table.rows.positions(index.find(query))
+        if not found_rows:
+            continue
+        offset = (number - column) * step
+        after = offset > 0 or inclusive and offset == 0
+        if backwards:
+            position = (bisect_right if after else bisect_left)(found_rows, row - 1)
+            wrapped = position == 0
+            candidate = (wrapped, -(found_rows[position - 1] + 1), -number)
+        else:
+            position = (bisect_left if after else bisect_right)(found_rows, row - 1)
+            wrapped = position == len(found_rows)
+            candidate = (wrapped, found_rows[0 if wrapped else position] + 1, number)
+        if best is None or candidate < best:
+            best = candidate
+    if best is None:
+        return None
+    return abs(best[2]), abs(best[1])
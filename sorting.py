@@ -0,0 +1,145 @@
+"""
+This module is a part of CSVEdit.
+It contains functions that find the order of the rows of a table
+sorted by the values of one of its columns.
+"""
+import re
+import math
+import heapq
+import pickle
+import tempfile
+from array import array
+from contextlib import ExitStack
+from operator import itemgetter
+
+# Number of bytes the keys of a column can take while they are sorted,
+# longer columns are sorted in runs that are merged from temporary files
+# Default: 268435456
+memory_limit = 256 * 2 ** 20
+
+# Approximate number of bytes taken by the key of a row while it is sorted
+KEY_SIZE = 128
+
+# Number of sorted keys that are written to a run file at once
+# Default: 4096
+batch_size = 4096
+
+# Dates that are sorted by their value, as a pattern and the positions
+# of the year, month, day, hours, minutes and seconds in it
+DATE_FORMATS = [(r"(\d{4})-(\d\d?)-(\d\d?)(?:[ T](\d\d?):(\d\d)(?::(\d\d))?)?", (0, 1, 2, 3, 4, 5)),
+                (r"(\d\d?)\.(\d\d?)\.(\d{4})(?: (\d\d?):(\d\d)(?::(\d\d))?)?", (2, 1, 0, 3, 4, 5)),
+                (r"(\d\d?)/(\d\d?)/(\d{4})(?: (\d\d?):(\d\d)(?::(\d\d))?)?", (2, 0, 1, 3, 4, 5))]
+
+def number_key(value):
+    """Returns the key of a number, values that are not a number come after all the others"""
+    key = float(value)
+    if key != key:
+        return math.inf
+    return key
+
+def get_date_key(pattern: str, order: tuple):
+    """Returns a function that turns the dates written in a given pattern into keys"""
+    expression = re.compile(pattern)
+
+    def date_key(value):
+        match = expression.fullmatch(value)
+        if match is None:
+            raise ValueError(f"Not a date: '{value}'")
+        groups = match.groups("0")
+        return tuple(int(groups[index]) for index in order)
+
+    return date_key
+
+# Functions that turn values into keys, from the most specific kind of values
+# to the least, a column is sorted by the first one that accepts all of its values
+KEY_FUNCTIONS = [int, number_key, *(get_date_key(*date_format) for date_format in DATE_FORMATS), str]
+
+def make_keys(values: list, key_functions: list):
+    """
+    Returns the keys of values made by the first of [key_functions]
+    that accepts all of them, the functions before it are removed from the list
+    """
+    types = set(map(type, values))
+    while True:
+        # int() would also cut off the fractions of the values that were read as floats
+        if key_functions[0] is not int or float not in types:
+            try:
+                return list(map(key_functions[0], values))
+            except (ValueError, TypeError):
+                pass
+        del key_functions[0]
+
+def sort_run(values: list, start: int, key_functions: list, descending: bool):
+    """
+    Returns the positions of the rows starting at [start] that hold given values
+    in sorted order, and the positions of the rows whose values are empty
+    """
+    positions = [position for position, value in enumerate(values, start)
+                 if value is not None and value != ""]
+    keys = make_keys([values[position - start] for position in positions], key_functions)
+    empty = [position for position, value in enumerate(values, start) if value is None or value == ""]
+    order = sorted(range(len(keys)), key=keys.__getitem__, reverse=descending)
+    return list(map(positions.__getitem__, order)), empty
+
+def write_run(file, values: list, positions: list):
+    """Writes the values and the positions of the rows of a sorted run to a temporary file"""
+    file.seek(0)
+    file.truncate()
+    for start in range(0, len(values), batch_size):
+        pickle.dump(list(zip(values[start:start + batch_size], positions[start:start + batch_size])), file)
+    file.seek(0)
+
+def read_run(file):
+    """Yields the values and the positions of the rows of a sorted run from a temporary file"""
+    file.seek(0)
+    while True:
+        try:
+            yield from pickle.load(file)
+        except EOFError:
+            return
+
+def sort_order(read_values, count: int, descending: bool = False):
+    """
+    Returns the positions (counting from 0) of [count] rows in the order
+    that sorts them by their values, read_values(start, stop) returns
+    the values of the rows from [start] up to, but not including, [stop].
+    Rows with equal values keep their order, and rows with empty values
+    come last in both directions.
+    """
+    run_rows = max(memory_limit // KEY_SIZE, 1)
+    key_functions = list(KEY_FUNCTIONS)
+    if count <= run_rows:
+        positions, empty = sort_run(read_values(0, count), 0, key_functions, descending)
+        return array('Q', positions + empty)
+
+    empty = array('Q')
+    with ExitStack() as stack:
+        runs = []
+        for start in range(0, count, run_rows):
+            values = read_values(start, min(start + run_rows, count))
+            positions, run_empty = sort_run(values, start, key_functions, descending)
+            empty.extend(run_empty)
+            runs.append((stack.enter_context(tempfile.TemporaryFile()), key_functions[0]))
+            write_run(runs[-1][0], [values[position - start] for position in positions], positions)
+            del values, positions
+
+        # The runs are merged by keys that accept the values of all of them,
+        # the runs that were sorted by other keys are sorted again
+        key_function = None
+        while key_function is not key_functions[0]:
+            key_function = key_functions[0]
+            for file, run_function in runs:
+                if run_function is not key_function:
+                    make_keys([value for value, _ in read_run(file)], key_functions)
+        for file, run_function in runs:
+            if run_function is not key_function:
+                pairs = sorted(read_run(file), key=itemgetter(1))
+                pairs.sort(key=lambda pair: key_function(pair[0]), reverse=descending)
+                write_run(file, [value for value, _ in pairs], [position for _, position in pairs])
+
+        # Equal keys are taken from the earlier runs first, so the merge is stable
+        merged = heapq.merge(*(read_run(file) for file, _ in runs),
+                             key=lambda pair: key_function(pair[0]), reverse=descending)
+        order = array('Q', map(itemgetter(1), merged))
+    order.extend(empty)
+    return order
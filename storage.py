@@ -0,0 +1,550 @@
+"""
+This module is a part of CSVEdit.
+It contains the compact column storage that is used by the "Table" class.
+"""
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from itertools import accumulate, compress
+from operator import add
+
+# Kinds of values a cell can hold, a value is restored
+# from its text by calling the function of its kind
+NULL = 0
+TEXT = 1
+FLOAT = 2
+INT = 3
+KIND_TYPES = {type(None): NULL, str: TEXT, float: FLOAT, int: INT}
+KIND_FUNCTIONS = [None, bytes.decode, float, int]
+
+def get_kind(value):
+    """Returns the kind of a value"""
+    if value is None:
+        return NULL
+    return KIND_TYPES.get(type(value), TEXT)
+
+def get_number(value):
+    """Returns a value as a finite float, or None if it is not a number"""
+    try:
+        number = float(value)
+    except (ValueError, TypeError):
+        return None
+    return number if math.isfinite(number) else None
+
+def add_partial(partials: list, number: float):
+    """
+    Adds a number to a sum kept as partial sums that do not overlap (like the ones
+    of math.fsum), so the sum stays exact however many numbers are added and taken
+    away. Returns False if the sum became too large for a float.
+    """
+    index = 0
+    for partial in partials:
+        if abs(number) < abs(partial):
+            number, partial = partial, number
+        high = number + partial
+        low = partial - (high - number)
+        if low:
+            partials[index] = low
+            index += 1
+        number = high
+    partials[index:] = [number]
+    return math.isfinite(number)
+
+def exact_sum(numbers):
+    """
+    Returns the correctly rounded sum of finite numbers,
+    or an infinite one if the sum is too large for a float
+    """
+    try:
+        return math.fsum(numbers)
+    except OverflowError:
+        # The partial sums of scaled down numbers can not overflow, only the result can
+        scale = 2.0 ** max(len(numbers), 2).bit_length()
+        return math.fsum(number / scale for number in numbers) * scale
+
+# Number of cells whose values are read at once when the numbers of a column are read
+# Default: 65536
+summary_batch_size = 65536
+
+# A column buffer is compacted once it holds at least this many bytes
+# of overwritten values and they make up more than a half of it
+# Default: 65536
+compaction_threshold = 65536
+
+class Column:
+    """
+    A column of values stored compactly.
+    All values are kept as utf-8 encoded text in one shared buffer,
+    a cell is an offset and a length in that buffer, and the kind of
+    its value (text, number or None) is kept in a mask.
+    The column also counts how many of its values have each length,
+    so the length of the longest one is always known.
+    Once the numbers of the column are needed, and while all of its values
+    are numbers, they are also kept as floats in an array (cells with no text
+    hold 0.0), and their exact sum, minimum and maximum are updated
+    as the cells change.
+    """
+    def __init__(self, size: int = 0):
+        # Creates a column of [size] empty cells
+        self.buffer = bytearray()
+        self.offsets = array('Q', [0]) * size
+        self.lengths = array('I', [0]) * size
+        self.kinds = bytearray(size)
+        self.garbage = 0
+        self.widths = {}
+        self.longest = 0
+        self.filled = 0
+        # A search index of the column is told about the cells that change
+        self.index = None
+        # Numbers of the cells, None until they are read,
+        # or once a value that is not a number is added
+        self.numbers = None
+        # Whether the numbers have to be read again from the values, because
+        # they were never read or a column that held other values got a number
+        self.stale = True
+        # Partial sums of the numbers (see "add_partial") and their minimum
+        # and maximum, None when they have to be found again
+        self.totals = None
+        self.extremes = None
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def get(self, index: int):
+        """Returns the value stored at a given index"""
+        kind = self.kinds[index]
+        if kind == NULL:
+            return None
+        start = self.offsets[index]
+        data = self.buffer[start:start + self.lengths[index]]
+        if kind == TEXT:
+            return data.decode()
+        return KIND_FUNCTIONS[kind](data)
+
+    def values(self, indices):
+        """Returns the values stored at given indices"""
+        result = None
+        if isinstance(indices, range) and indices.step == 1 and indices:
+            kinds = bytes(self.kinds[indices.start:indices.stop])
+            result = self.contiguous_texts(indices.start, indices.stop)
+        else:
+            kinds = bytes(map(self.kinds.__getitem__, indices))
+        if kinds.count(NULL) == len(kinds):
+            return [None] * len(kinds)
+        if result is None:
+            starts = list(map(self.offsets.__getitem__, indices))
+            stops = map(add, starts, map(self.lengths.__getitem__, indices))
+            result = list(map(bytearray.decode, map(self.buffer.__getitem__, map(slice, starts, stops))))
+        if kinds.count(TEXT) != len(kinds):
+            # Empty cells and numbers are restored one by one
+            for position in compress(range(len(kinds)), map(TEXT.__ne__, kinds)):
+                kind = kinds[position]
+                result[position] = None if kind == NULL else KIND_FUNCTIONS[kind](result[position])
+        return result
+
+    def contiguous_texts(self, start: int, stop: int):
+        """
+        Returns the texts of the cells from [start] up to, but not including, [stop]
+        when they are stored one after another in the buffer as ascii text,
+        which lets them be decoded at once. Returns None otherwise.
+        """
+        offsets = self.offsets[start:stop]
+        lengths = self.lengths[start:stop]
+        if offsets != array('Q', accumulate(lengths[:-1], initial=offsets[0])):
+            return None
+        data = self.buffer[offsets[0]:offsets[-1] + lengths[-1]]
+        text = data.decode()
+        if len(text) != len(data):
+            return None
+        positions = list(accumulate(lengths, initial=0))
+        return list(map(text.__getitem__, map(slice, positions, positions[1:])))
+
+    def width(self, index: int):
+        """Returns the length of the text of a value stored at a given index"""
+        length = self.lengths[index]
+        start = self.offsets[index]
+        data = self.buffer[start:start + length]
+        if data.isascii():
+            return length
+        return len(data.decode())
+
+    def count(self):
+        """Returns the number of cells that hold a value, cells with empty text are not counted"""
+        return self.filled - self.widths.get(0, 0)
+
+    def count_width(self, width: int, count: int = 1):
+        """Adds (or removes when [count] is negative) values of a given length to the counts"""
+        total = self.widths.get(width, 0) + count
+        self.filled += count
+        if total:
+            self.widths[width] = total
+            if width > self.longest:
+                self.longest = width
+            return
+        del self.widths[width]
+        if width == self.longest:
+            self.longest = max(self.widths, default=0)
+
+    def set(self, index: int, value):
+        """Sets the value stored at a given index"""
+        if self.numbers is not None:
+            self.set_number(index, value)
+        elif not self.stale:
+            self.stale = get_number(value) is not None or value is None or value == ""
+        old_length = self.lengths[index]
+        if self.kinds[index] != NULL:
+            self.count_width(self.width(index), -1)
+        if self.index is not None:
+            self.index.discard(index)
+        kind = get_kind(value)
+        if kind == NULL:
+            self.kinds[index] = NULL
+            self.lengths[index] = 0
+            self.garbage += old_length
+            return
+        text = str(value)
+        data = text.encode()
+        length = len(data)
+        if length <= old_length:
+            # The new value fits in place of the old one
+            start = self.offsets[index]
+            self.buffer[start:start + length] = data
+            self.garbage += old_length - length
+        else:
+            self.offsets[index] = len(self.buffer)
+            self.buffer += data
+            self.garbage += old_length
+        self.lengths[index] = length
+        self.kinds[index] = kind
+        self.count_width(len(text))
+        if self.garbage > compaction_threshold and self.garbage * 2 > len(self.buffer):
+            self.compact()
+
+    def set_number(self, index: int, value):
+        """Updates the number of a cell and the summary of the numbers when its value changes"""
+        number = None
+        if value is not None and value != "":
+            number = get_number(value)
+            if number is None:
+                self.drop_numbers()
+                return
+        self.update_summary(self.numbers[index] if self.lengths[index] else None, number)
+        self.numbers[index] = 0.0 if number is None else number
+
+    def update_summary(self, old, new):
+        """Updates the summary of the numbers when a number (or None) is replaced by another one"""
+        if self.totals is not None:
+            # A sum too large for a float is found again from the numbers
+            for number in (-old if old is not None else None, new):
+                if number is not None and not add_partial(self.totals, number):
+                    self.totals = None
+                    break
+        if self.extremes is not None:
+            minimum, maximum = self.extremes
+            if old is not None and old in self.extremes:
+                # The old number might have been the only one this small or large
+                self.extremes = None
+            elif new is not None:
+                self.extremes = (new if minimum is None else min(minimum, new),
+                                 new if maximum is None else max(maximum, new))
+
+    def drop_numbers(self):
+        """Stops keeping the numbers of the column"""
+        self.numbers = None
+        self.totals = None
+        self.extremes = None
+
+    def extend_numbers(self, texts: list):
+        """Appends the numbers of given texts of values (or numbers), empty texts are empty cells"""
+        empty = texts.count("")
+        if empty == len(texts):
+            self.numbers.extend(array('d', [0.0]) * empty)
+            return
+        try:
+            if empty:
+                texts = [text or "0" for text in texts]
+            numbers = array('d', map(float, texts))
+        except ValueError:
+            self.drop_numbers()
+            return
+        # Infinite and missing numbers make the sum infinite or missing,
+        # and so can a sum that is too large
+        if not math.isfinite(sum(numbers)) and not all(map(math.isfinite, numbers)):
+            self.drop_numbers()
+            return
+        self.numbers.extend(numbers)
+        self.totals = None
+        self.extremes = None
+
+    def summarize(self):
+        """
+        Returns the count, the sum, the minimum and the maximum of the numbers
+        of the column, or None if it holds values that are not numbers.
+        The values are read the first time, and again when a column that held
+        other values gets a number, after that the numbers are kept up to date.
+        """
+        if self.numbers is None and self.stale:
+            self.stale = False
+            self.numbers = array('d')
+            for start in range(0, len(self), summary_batch_size):
+                values = self.values(range(start, min(start + summary_batch_size, len(self))))
+                if None in values:
+                    values = ["" if value is None else value for value in values]
+                self.extend_numbers(values)
+                if self.numbers is None:
+                    break
+        if self.numbers is None:
+            return None
+        if self.totals is None:
+            total = exact_sum(self.numbers)
+            if math.isfinite(total):
+                self.totals = [total]
+        else:
+            total = exact_sum(self.totals)
+        if self.extremes is None:
+            # Cells with no text are the ones without a number
+            self.extremes = (min(compress(self.numbers, self.lengths), default=None),
+                             max(compress(self.numbers, self.lengths), default=None))
+        return (self.count(), total, *self.extremes)
+
+    def extend(self, values):
+        """Appends values to the end of the column"""
+        try:
+            kinds = bytes(map(KIND_TYPES.__getitem__, map(type, values)))
+            # Only text and empty values can be used as they are
+            plain = max(kinds, default=NULL) <= TEXT
+        except KeyError:
+            kinds = bytes(map(get_kind, values))
+            plain = False
+        if plain:
+            texts = [value or '' for value in values]
+        else:
+            texts = ['' if value is None else str(value) for value in values]
+        if self.numbers is not None:
+            self.extend_numbers(texts)
+        encoded = list(map(str.encode, texts))
+        lengths = array('I', map(len, encoded))
+        self.offsets.extend(accumulate(lengths[:-1], initial=len(self.buffer)) if encoded else ())
+        self.lengths.extend(lengths)
+        self.kinds.extend(kinds)
+        self.buffer += b''.join(encoded)
+        widths = Counter(map(len, texts))
+        widths[0] -= kinds.count(NULL)
+        for width, count in widths.items():
+            if count:
+                self.count_width(width, count)
+
+    def extend_column(self, column):
+        """Appends the cells of another column to the end of the column"""
+        start = len(self.buffer)
+        self.buffer += column.buffer
+        self.offsets.extend(map(start.__add__, column.offsets))
+        self.lengths.extend(column.lengths)
+        self.kinds.extend(column.kinds)
+        self.garbage += column.garbage
+        for width, count in column.widths.items():
+            self.count_width(width, count)
+        if self.numbers is not None and column.numbers is not None:
+            self.numbers.extend(column.numbers)
+            self.totals = None
+            self.extremes = None
+        elif self.numbers is not None:
+            self.drop_numbers()
+            self.stale = column.stale
+
+    def grow(self, count: int):
+        """Appends [count] empty cells to the end of the column"""
+        self.offsets.extend(array('Q', [0]) * count)
+        self.lengths.extend(array('I', [0]) * count)
+        self.kinds.extend(bytes(count))
+        if self.numbers is not None:
+            self.numbers.extend(array('d', [0.0]) * count)
+
+    def clear(self, indices):
+        """Empties the cells at given indices"""
+        kinds = self.kinds
+        lengths = self.lengths
+        removed = Counter()
+        for index in indices:
+            if kinds[index] != NULL:
+                removed[self.width(index)] += 1
+            if self.index is not None:
+                self.index.discard(index)
+            if self.numbers is None:
+                self.stale = True
+            elif lengths[index]:
+                self.update_summary(self.numbers[index], None)
+                self.numbers[index] = 0.0
+            self.garbage += lengths[index]
+            lengths[index] = 0
+            kinds[index] = NULL
+        for width, count in removed.items():
+            self.count_width(width, -count)
+
+    def compact(self):
+        """Rebuilds the buffer without the overwritten values"""
+        buffer = bytearray()
+        offsets = self.offsets
+        for index, length in enumerate(self.lengths):
+            if length:
+                start = offsets[index]
+                offsets[index] = len(buffer)
+                buffer += self.buffer[start:start + length]
+        self.buffer = buffer
+        self.garbage = 0
+
+    def nbytes(self):
+        """Returns the approximate number of bytes used by the column"""
+        size = (len(self.buffer) + self.offsets.itemsize * len(self.offsets)
+                + self.lengths.itemsize * len(self.lengths) + len(self.kinds))
+        if self.numbers is not None:
+            size += self.numbers.itemsize * len(self.numbers)
+        return size
+
+# Maximum number of rows kept in one block of a row index
+# Default: 1024
+block_size = 1024
+
+class RowIndex:
+    """
+    Maps positions of the rows in a table to the slots that hold
+    their cells in the columns. The slots are kept in blocks of limited
+    size, so inserting or removing rows only moves the slots of one block.
+    Blocks of consecutive slots that were never changed are kept
+    as ranges, which take no memory per row.
+    """
+    def __init__(self, size: int = 0):
+        # Creates an index of [size] rows held in slots 0 to [size - 1]
+        self.blocks = []
+        self.starts = []
+        self.length = 0
+        self.regular = True
+        self.insert(0, range(size))
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, position: int):
+        if self.regular:
+            block, offset = divmod(position, block_size)
+            return self.blocks[block][offset]
+        block = bisect_right(self.starts, position) - 1
+        return self.blocks[block][position - self.starts[block]]
+
+    def __iter__(self):
+        for block in self.blocks:
+            yield from block
+
+    def update_starts(self):
+        """Recalculates positions of the first rows of the blocks"""
+        self.blocks = [block for block in self.blocks if block]
+        self.starts = list(accumulate(map(len, self.blocks[:-1]), initial=0)) if self.blocks else []
+        self.regular = (all(len(block) == block_size for block in self.blocks[:-1])
+                        and sum(map(len, self.blocks[-1:])) <= block_size)
+
+    def locate(self, position: int):
+        """Returns the block and the offset in it of the row at a given position"""
+        if not self.blocks:
+            self.blocks.append(array('Q'))
+            self.starts.append(0)
+        if position >= self.length:
+            return len(self.blocks) - 1, len(self.blocks[-1])
+        block = bisect_right(self.starts, position) - 1
+        return block, position - self.starts[block]
+
+    def get_block(self, block: int):
+        """Returns a block that can be changed in place"""
+        if isinstance(self.blocks[block], range):
+            self.blocks[block] = array('Q', self.blocks[block])
+        return self.blocks[block]
+
+    def slots(self, start: int, stop: int):
+        """
+        Returns the slots of the rows in range [start, stop),
+        as a range when they are consecutive and were never changed
+        """
+        if start >= stop:
+            return array('Q')
+        parts = []
+        count = 0
+        block, offset = self.locate(start)
+        while count < stop - start and block < len(self.blocks):
+            parts.append(self.blocks[block][offset:offset + stop - start - count])
+            count += len(parts[-1])
+            block += 1
+            offset = 0
+        if all(isinstance(part, range) for part in parts) \
+           and all(previous.stop == part.start for previous, part in zip(parts, parts[1:])):
+            return range(parts[0].start, parts[-1].stop)
+        result = array('Q')
+        for part in parts:
+            result.extend(part)
+        return result
+
+    def runs(self):
+        """Yields the slots of the rows in their order as ranges of consecutive slots"""
+        run = None
+        for block in self.blocks:
+            for part in [block] if isinstance(block, range) else map(range, block, map((1).__add__, block)):
+                if run is not None and run.stop == part.start:
+                    run = range(run.start, part.stop)
+                    continue
+                if run is not None:
+                    yield run
+                run = part
+        if run:
+            yield run
+
+    def positions(self, slots: set):
+        """Returns the sorted positions of the rows held in given slots"""
+        result = []
+        ordered = sorted(slots)
+        for start, block in zip(self.starts, self.blocks):
+            if isinstance(block, range):
+                first = bisect_left(ordered, block.start)
+                last = bisect_left(ordered, block.stop)
+                result.extend(map((start - block.start).__add__, ordered[first:last]))
+            else:
+                result.extend(compress(range(start, start + len(block)), map(slots.__contains__, block)))
+        return result
+
+    def append_range(self, slots: range):
+        """Adds rows held in a range of slots after the last row"""
+        if self.blocks and isinstance(self.blocks[-1], range) and self.blocks[-1].stop == slots.start:
+            slots = range(self.blocks.pop().start, slots.stop)
+        elif self.blocks and len(self.blocks[-1]) < block_size:
+            taken = block_size - len(self.blocks[-1])
+            self.get_block(len(self.blocks) - 1).extend(slots[:taken])
+            slots = slots[taken:]
+        self.blocks.extend(slots[start:start + block_size]
+                           for start in range(0, len(slots), block_size))
+
+    def insert(self, position: int, slots):
+        """Inserts rows held in given slots before a given position"""
+        if position >= self.length and isinstance(slots, range) and slots.step == 1:
+            self.append_range(slots)
+        else:
+            block, offset = self.locate(position)
+            target = self.get_block(block)
+            target[offset:offset] = array('Q', slots)
+            if len(target) > 2 * block_size:
+                self.blocks[block:block + 1] = [target[start:start + block_size]
+                                                for start in range(0, len(target), block_size)]
+        self.length += len(slots)
+        self.update_starts()
+
+    def delete(self, start: int, stop: int):
+        """Removes the rows in range [start, stop) and returns their slots"""
+        removed = self.slots(start, stop)
+        block, offset = self.locate(start)
+        remaining = len(removed)
+        while remaining:
+            taken = min(remaining, len(self.blocks[block]) - offset)
+            del self.get_block(block)[offset:offset + taken]
+            remaining -= taken
+            block += 1
+            offset = 0
+        self.length -= len(removed)
+        self.update_starts()
+        return removed
@@ -1,15 +1,48 @@
 """
 This module is a part of CSVEdit.
-It contains a "Table" class that stores values of any type, and functions
+It contains a "Table" class that stores text values, and functions
 that allow turning csv files into tables and vice versa.
 """
+import io
+import os
 import csv
-from quotesniff import sniff_quoting
+import mmap
+import stat
+import tempfile
+from array import array
+from itertools import islice, repeat, zip_longest
+from loader import Loader
+from quotesniff import sniff_quoting_lines, sniff_escapechar
+import sorting
+from search import SearchIndex
+from storage import Column, RowIndex
 
 # Symbols that sniffer can use as delimeters
 # Default: ',;|\t'
 valid_delimeters = ',;|\t'
 
+# Number of characters at the start of a file that are used
+# to determine its quoting
+# Default: 65536
+sample_size = 65536
+
+# Number of rows that are read from a file before they are added to a table
+# Default: 4096
+batch_size = 4096
+
+# Number of processes that parse a file at once,
+# files are parsed by the editor itself when it is 1
+# Default: 1
+workers = 1
+
+# Number of bytes of a file that a process parses at once
+# Default: 67108864
+part_size = 64 * 2 ** 20
+
+# Attributes of a dialect that are passed to the processes that parse a file
+DIALECT_ATTRIBUTES = ("delimiter", "quotechar", "escapechar", "doublequote",
+                      "skipinitialspace", "lineterminator", "quoting", "strict")
+
 def get_column(column):
     """
     Function that returns alpha name of a column
@@ -25,9 +58,24 @@ def get_column(column):
         result[:0] = alphabet[remainder]
     return ''.join(result)
 
+def get_column_number(column):
+    """
+    Function that returns numerical representation of a column
+    from its alpha name
+    """
+
+    if isinstance(column, int):
+        return column
+    result = 0
+    for letter in column.upper():
+        result = result * 26 + ord(letter) - ord('A') + 1
+    return result
+
 class Table:
     """
-    A class that stores values of any type in a table,
+    A class that stores text values in a table.
+    Columns are kept in a list and addressed by their number internally,
+    letters are only used to display them.
     """
     def __init__(self, column_count, row_count):
         # Creates an empty (filled with None values) table with
@@ -35,72 +83,174 @@ class Table:
         self.dialect = None
         self.column_count = column_count
         self.row_count = row_count
-        self.columns = {}
-        for column in range(1, self.column_count + 1):
-            self.columns[get_column(column)] = [None for i in range(1, self.row_count + 1)]
+        self.rows = RowIndex(self.row_count)
+        self.slot_count = self.row_count
+        self.free_slots = []
+        self.columns = [Column(self.slot_count) for _ in range(self.column_count)]
 
     def get_cell(self, column, row: int):
         """Returns the value stored in a cell"""
-        return self.columns[get_column(column)][row - 1]
+        return self.columns[get_column_number(column) - 1].get(self.rows[row - 1])
 
     def set_cell(self, column, row: int, value):
         """Sets the value of a cell"""
-        self.columns[get_column(column)][row  - 1] = value
+        self.columns[get_column_number(column) - 1].set(self.rows[row - 1], value)
+
+    def get_rows(self, start: int, stop: int):
+        """Returns the values of the rows from [start] up to, but not including, [stop]"""
+        slots = self.rows.slots(start - 1, stop - 1)
+        if not self.columns:
+            return [()] * len(slots)
+        return list(zip(*(column.values(slots) for column in self.columns)))
+
+    def get_column_values(self, column, start: int, stop: int):
+        """Returns the values of a column in the rows from [start] up to, but not including, [stop]"""
+        return self.columns[get_column_number(column) - 1].values(self.rows.slots(start - 1, stop - 1))
+
+    def write_rows(self, file):
+        """Writes the rows of the table as csv to an open binary file"""
+        text_file = io.TextIOWrapper(file, encoding="utf-8")
+        # Empty cells are written as empty strings by the writer
+        writer = csv.writer(text_file, dialect=self.dialect)
+        for start in range(1, self.row_count + 1, batch_size):
+            writer.writerows(self.get_rows(start, min(start + batch_size, self.row_count + 1)))
+        text_file.flush()
+        text_file.detach()
 
     def add_column(self):
         """Adds an empty column to the right of the table"""
-        new_column_letter = get_column(self.column_count + 1)
-        self.columns[new_column_letter] = [None for i in range(1, self.row_count + 1)]
-        self.column_count += 1
+        self.insert_column(self.column_count)
 
     def add_row(self):
         """Adds an empty row to the bottom of the table"""
-        self.row_count += 1
-        for column in range(1, self.column_count + 1):
-            self.columns[get_column(column)].append(None)
-
-    def insert_column(self, column_index: int):
-        """ Inserts an empty column in the table at a given index """
-        self.add_column()
-        for index in reversed(range(column_index + 1, self.column_count)):
-            temp_column = self.columns[get_column(index)]
-            self.columns[get_column(index)] = self.columns[get_column(index + 1)]
-            self.columns[get_column(index + 1)] = temp_column
-
-    def insert_row(self, row_index: int):
-        """ Inserts an empty row in the table at a given index """
-        self.add_row()
-        for index in reversed(range(row_index, self.row_count - 1)):
-            temp_row = []
-            for column in range(1, self.column_count + 1):
-                temp_row.append(self.columns[get_column(column)][index])
-            for column in range(1, self.column_count + 1):
-                self.columns[get_column(column)][index] = self.columns[get_column(column)][index + 1]
-            for column in range(1, self.column_count + 1):
-                self.columns[get_column(column)][index + 1] = temp_row[column - 1]
+        self.insert_rows(self.row_count, 1)
+
+    def insert_column(self, column_index: int, column: Column = None):
+        """
+        Inserts an empty column in the table at a given index,
+        or a column that was removed from it before
+        """
+        if column is None:
+            column = Column(self.slot_count)
+        # Rows might have been added since the column was removed
+        column.grow(self.slot_count - len(column))
+        self.columns.insert(column_index, column)
+        self.column_count += 1
+
+    def insert_row(self, row_index: int, row: list = None):
+        """
+        Inserts an empty row in the table at a given index,
+        or a row that was removed from it before
+        """
+        self.insert_rows(row_index, 1)
+        for column, value in enumerate(row or [], 1):
+            if value is not None:
+                self.set_cell(column, row_index + 1, value)
+
+    def insert_rows(self, row_index: int, count: int):
+        """Inserts [count] empty rows in the table at a given index"""
+        # Slots freed by removed rows are reused before new ones are added
+        reused = self.free_slots[max(len(self.free_slots) - count, 0):]
+        del self.free_slots[len(self.free_slots) - len(reused):]
+        added = count - len(reused)
+        for column in self.columns:
+            column.grow(added)
+        slots = reused + list(range(self.slot_count, self.slot_count + added))
+        self.slot_count += added
+        self.rows.insert(row_index, slots)
+        self.row_count += count
+
+    def extend_rows(self, rows: list):
+        """Appends rows of values to the bottom of the table"""
+        for _ in range(self.column_count, max(map(len, rows), default=0)):
+            self.add_column()
+        values = list(zip_longest(*rows))
+        for index, column in enumerate(self.columns):
+            if index < len(values):
+                column.extend(values[index])
+            else:
+                column.grow(len(rows))
+        self.rows.insert(self.row_count, range(self.slot_count, self.slot_count + len(rows)))
+        self.slot_count += len(rows)
+        self.row_count += len(rows)
+
+    def extend_table(self, table):
+        """
+        Appends the rows of another table to the bottom of the table,
+        the other table must not have been changed since it was filled
+        """
+        for _ in range(self.column_count, table.column_count):
+            self.add_column()
+        for index, column in enumerate(self.columns):
+            if index < table.column_count:
+                column.extend_column(table.columns[index])
+            else:
+                column.grow(table.row_count)
+        self.rows.insert(self.row_count, range(self.slot_count, self.slot_count + table.row_count))
+        self.slot_count += table.row_count
+        self.row_count += table.row_count
 
     def remove_column(self, column_index: int):
-        """Removes a column from a table at a given index"""
-        for index in range(column_index, self.column_count):
-            temp_column = self.columns[get_column(index)]
-            self.columns[get_column(index)] = self.columns[get_column(index + 1)]
-            self.columns[get_column(index + 1)] = temp_column
-        self.columns.pop(get_column(self.column_count), None)
+        """Removes a column from a table at a given index and returns it"""
         self.column_count -= 1
+        return self.columns.pop(column_index - 1)
 
     def remove_row(self, row_index: int):
-        """Removes a row from a table at a given index"""
-        for index in range(row_index - 1, self.row_count - 1):
-            temp_row = []
-            for column in range(1, self.column_count + 1):
-                temp_row.append(self.columns[get_column(column)][index])
-            for column in range(1, self.column_count + 1):
-                self.columns[get_column(column)][index] = self.columns[get_column(column)][index + 1]
-            for column in range(1, self.column_count + 1):
-                self.columns[get_column(column)][index + 1] = temp_row[column - 1]
-        for index in range(self.column_count):
-            self.columns[get_column(index + 1)].pop(self.row_count - 1)
-        self.row_count -= 1
+        """Removes a row from a table at a given index and returns its values"""
+        row = list(self.get_rows(row_index, row_index + 1)[0])
+        self.remove_rows(row_index, row_index + 1)
+        return row
+
+    def remove_rows(self, start: int, stop: int):
+        """Removes the rows from [start] up to, but not including, [stop]"""
+        slots = self.rows.delete(start - 1, stop - 1)
+        for column in self.columns:
+            column.clear(slots)
+        self.free_slots.extend(slots)
+        self.row_count -= len(slots)
+
+    def sort_rows(self, column, descending: bool = False):
+        """
+        Sorts the rows of the table by the values of a column
+        and returns the order that restores them (see "permute_rows")
+        """
+        order = sorting.sort_order(lambda start, stop: self.get_column_values(column, start + 1, stop + 1),
+                                   self.row_count, descending)
+        return self.permute_rows(order)
+
+    def permute_rows(self, order):
+        """
+        Moves the row at position [order[i]] (counting from 0) to position i
+        for every row at once, only the slots of the rows are moved and not
+        their values. Returns the order that moves them back.
+        """
+        slots = self.rows.slots(0, self.row_count)
+        rows = RowIndex()
+        rows.insert(0, array('Q', map(slots.__getitem__, order)))
+        self.rows = rows
+        inverse = array('Q', [0]) * len(order)
+        for position, previous in enumerate(order):
+            inverse[previous] = position
+        return inverse
+
+    def get_aggregates(self, column):
+        """
+        Returns the count, the sum, the minimum and the maximum of the values
+        of a column that holds numbers, or only the count of its values
+        (followed by None) when it holds other values
+        """
+        values = self.columns[get_column_number(column) - 1]
+        summary = values.summarize()
+        if summary is None:
+            return values.count(), None, None, None
+        return summary
+
+    def get_search_index(self, column):
+        """Returns the search index of a column, building it when it is first needed"""
+        values = self.columns[get_column_number(column) - 1]
+        if values.index is None:
+            values.index = SearchIndex(values)
+        return values.index
 
     def column_is_empty(self, column):
         result = True
@@ -126,10 +276,11 @@ class Table:
 
     def max_len(self, column):
         """Returns the maximum length of the values a column"""
-        longest = 1
-        for value in self.columns[get_column(column)]:
-            if len(str(value)) > longest:
-                longest = len(str(value))
+        values = self.columns[get_column_number(column) - 1]
+        longest = max(values.longest, 1)
+        if values.filled < self.row_count:
+            # Empty cells are measured by their text representation
+            longest = max(longest, len(str(None)))
         return longest
 
     def __str__(self):
@@ -144,53 +295,196 @@ class Table:
             return_string = return_string + "\n"
         return return_string
 
-def file_open(file_name):
-    """Opens a csv file as a table object"""
-    with open(file_name, encoding="utf-8") as file:
-        # Determine the dialect of the file
-        dialect = csv.Sniffer().sniff(file.readline(), delimiters=valid_delimeters)
-        dialect.quoting = sniff_quoting(file_name, dialect)
+def sniff_dialect(file):
+    """
+    Determines the dialect of an open csv file from its first line
+    and its quoting and escaping from a sample at the start of the file
+    """
+    dialect = csv.Sniffer().sniff(file.readline(), delimiters=valid_delimeters)
+    file.seek(0)
+    dialect.escapechar = sniff_escapechar(file.read(sample_size), dialect)
+    file.seek(0)
+    # Quotes in values are doubled unless they are escaped, the sniffer
+    # only sees doubled quotes when the first line happens to have some
+    dialect.doublequote = not dialect.escapechar
+    if dialect.escapechar:
+        # No value is quoted, the quotes in them are escaped
+        dialect.quoting = csv.QUOTE_NONE
+        return dialect
+    dialect.quoting = sniff_quoting_lines(file, dialect, max_size=sample_size)
+    file.seek(0)
+    return dialect
+
+def read_batches(file, dialect):
+    """Yields batches of rows of values read from an open csv file"""
+    filereader = csv.reader(file, dialect)
+    while batch := list(islice(filereader, batch_size)):
+        yield [[None if value == "" else value for value in row] for row in batch]
+
+def portable_dialect(dialect):
+    """Returns a copy of a dialect that can be passed to another process"""
+    result = csv.excel()
+    for attribute in DIALECT_ATTRIBUTES:
+        if hasattr(dialect, attribute):
+            setattr(result, attribute, getattr(dialect, attribute))
+    return result
+
+def find_parts(file_name, dialect, size: int, first_size: int = None):
+    """
+    Splits a csv file into ranges of about [size] bytes (the first one
+    about [first_size] bytes) that start and end at the ends of rows.
+    A line break ends a row when the number of quotes before it is even.
+    """
+    file_size = os.path.getsize(file_name)
+    if dialect.escapechar or not file_size:
+        # Escaped quotes cannot be told apart from the other ones by counting
+        return [(0, file_size)]
+    quote = None
+    if dialect.quotechar and dialect.quoting != csv.QUOTE_NONE:
+        quote = dialect.quotechar.encode()
 
-        file.seek(0)
+    boundaries = [0]
+    quotes = 0
+    with open(file_name, "rb") as file, \
+         mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        while boundaries[-1] + (first_size or size) < file_size:
+            end = boundaries[-1] + (first_size or size)
+            first_size = None
+            if quote:
+                quotes += data[boundaries[-1]:end].count(quote)
+            while (line_end := data.find(b'\n', end)) >= 0:
+                if quote:
+                    quotes += data[end:line_end].count(quote)
+                end = line_end + 1
+                if quotes % 2 == 0:
+                    break
+            if line_end < 0 or end >= file_size:
+                break
+            boundaries.append(end)
+    boundaries.append(file_size)
+    return list(zip(boundaries, boundaries[1:]))
+
+def parse_part(file_name, dialect, start: int, stop: int):
+    """Parses the rows in a range of bytes of a csv file into a table"""
+    with open(file_name, "rb") as file:
+        file.seek(start)
+        data = file.read(stop - start)
+    # The text is decoded the same way as when the whole file is read
+    text = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8")
+    part_table = Table(0, 0)
+    for batch in read_batches(text, dialect):
+        part_table.extend_rows(batch)
+    return part_table
 
-        filereader = csv.reader(file, dialect)
+def parse_parts(file_name, dialect, parts: list, process_count: int):
+    """
+    Starts parsing ranges of bytes of a csv file in a pool of processes,
+    and returns an iterator over their tables in order
+    """
+    # Only large files are parsed in processes, so the module that starts them
+    # is imported here instead of slowing down every start of the editor
+    from concurrent.futures import ProcessPoolExecutor
 
-        # Determine the number of columns and rows in the file
-        # to create a table based on it
-        max_rows = 0
-        max_columns = 0
-        for row in filereader:
-            if len(row) > max_columns:
-                max_columns = len(row)
-            max_rows = max_rows + 1
+    # The processes are started here rather than by the first call
+    # of the iterator, which might happen in another thread
+    executor = ProcessPoolExecutor(process_count)
+    part_tables = executor.map(parse_part, repeat(file_name), repeat(portable_dialect(dialect)),
+                               *zip(*parts))
 
-        # Create emty table and set its dialect
-        return_table = Table(max_columns, max_rows)
+    def results():
+        with executor:
+            yield from part_tables
+
+    return results()
+
+def file_open(file_name, process_count: int = None):
+    """
+    Opens a csv file as a table object.
+    Large files are parsed in parts by [process_count] processes
+    (by default [workers]) and the parts are joined in order.
+    """
+    process_count = process_count or workers
+    with open(file_name, encoding="utf-8") as file:
+        dialect = sniff_dialect(file)
+        return_table = Table(0, 0)
         return_table.dialect = dialect
+        parts = find_parts(file_name, dialect, part_size) if process_count > 1 else []
 
-        file.seek(0)
+        if len(parts) > 1:
+            for part_table in parse_parts(file_name, dialect, parts, process_count):
+                return_table.extend_table(part_table)
+            return return_table
 
-        # Fill the table with data from the file
-        current_row = 0
-        for row in filereader:
-            current_row += 1
-            for column, value in enumerate(row):
-                if value == "":
-                    return_table.set_cell(column + 1, current_row, None)
-                    continue
-                return_table.set_cell(column + 1, current_row, value)
+        # Fill the table with data from the file in batches of rows
+        for batch in read_batches(file, dialect):
+            return_table.extend_rows(batch)
 
     return return_table
 
+def file_load(file_name, process_count: int = None):
+    """
+    Opens a csv file as a table object that holds only its first batch of rows,
+    and starts a loader that adds the rest of them.
+    Large files are parsed in parts by [process_count] processes (by default [workers]).
+    """
+    process_count = process_count or workers
+    file = open(file_name, encoding="utf-8")
+    dialect = sniff_dialect(file)
+    return_table = Table(0, 0)
+    return_table.dialect = dialect
+
+    parts = []
+    if process_count > 1:
+        # The first part is small, so the editor opens as soon as it is parsed
+        parts = find_parts(file_name, dialect, part_size, first_size=sample_size)
+    if len(parts) > 1:
+        file.close()
+        return_table.extend_table(parse_part(file_name, dialect, *parts[0]))
+        stops = [stop for _, stop in parts[1:]]
+        loader = Loader(zip(parse_parts(file_name, dialect, parts[1:], process_count), stops),
+                        return_table.extend_table, os.path.getsize(file_name))
+        loader.start()
+        return return_table, loader
+
+    batches = read_batches(file, dialect)
+    return_table.extend_rows(next(batches, []))
+
+    def parts():
+        with file:
+            for batch in batches:
+                # The text is decoded ahead of the reader, so this is approximate
+                yield batch, file.buffer.tell()
+
+    loader = Loader(parts(), return_table.extend_rows, os.path.getsize(file_name))
+    loader.start()
+    return return_table, loader
+
 def file_save(table: Table, file_name):
-    """Saves a table object as a csv file"""
-    with open(file_name, "w", encoding="utf-8") as file:
-        writer = csv.writer(file, dialect=table.dialect)
-        for row in range (1, table.row_count + 1):
-            row_out = []
-            for column in range (1, table.column_count + 1):
-                if table.get_cell(column, row) is None or table.get_cell(column, row) == 'None':
-                    row_out.append('')
-                else:
-                    row_out.append(table.get_cell(column, row))
-            writer.writerow(row_out)
+    """
+    Saves a table object as a csv file.
+    The table is written to a temporary file in the same directory
+    that replaces the file once it is complete, so a failed save
+    leaves the original file intact.
+    """
+    file_name = os.path.realpath(file_name)
+    if os.path.exists(file_name) and not os.access(file_name, os.W_OK):
+        raise PermissionError(f"Access denied: '{file_name}'")
+    try:
+        mode = stat.S_IMODE(os.stat(file_name).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+
+    directory, base_name = os.path.split(file_name)
+    descriptor, temp_name = tempfile.mkstemp(prefix=f".{base_name}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            table.write_rows(file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.chmod(temp_name, mode)
+        os.replace(temp_name, file_name)
+    except BaseException:
+        os.remove(temp_name)
+        raise
@@ -0,0 +1,148 @@
+"""
+This module is a part of CSVEdit.
+It contains checks of opening and saving lazy tables, run them from the folder
+of the editor with: python -m unittest discover test
+"""
+import io
+import os
+import csv
+import tempfile
+import unittest
+
+import tables
+import lazytables
+
+def read_rows(file_name: str):
+    """Returns the rows of a csv file as lists of values"""
+    with open(file_name, encoding="utf-8", newline="") as file:
+        return list(csv.reader(file))
+
+def make_rows(count: int):
+    """Returns rows of values, some of them have to be quoted"""
+    special = ["x,y", 'say "hi"', "two\nlines"]
+    return [[special[(row + column) % 3] if (row * column) % 7 == 1 else f"{row}-{column}"
+             for column in range(4)] for row in range(count)]
+
+class LazySaveTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.directory.name, "table.csv")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_file(self, rows: list, lineterminator: str = "\n"):
+        """Writes the rows of the file the tests open"""
+        with open(self.file_name, "w", encoding="utf-8", newline="") as file:
+            csv.writer(file, lineterminator=lineterminator).writerows(rows)
+
+    def assert_saved_alike(self, change):
+        """
+        Checks that a lazy table is saved the same as a table that holds
+        the whole file, after [change] was called with each of them
+        """
+        lazy_table = lazytables.file_open(self.file_name)
+        self.assertIsInstance(lazy_table, lazytables.LazyTable)
+        table = tables.file_open(self.file_name)
+        # Both write the rows with the line breaks of the file
+        table.dialect.lineterminator = lazy_table.dialect.lineterminator
+        change(lazy_table)
+        change(table)
+        lazy_name = os.path.join(self.directory.name, "lazy.csv")
+        tables.file_save(lazy_table, lazy_name)
+        with open(lazy_name, "rb") as file:
+            lazy_data = file.read()
+        # Table.write_rows encodes every row, the lazy table only the changed ones
+        with io.BytesIO() as file:
+            table.write_rows(file)
+            self.assertEqual(lazy_data, file.getvalue())
+
+    def test_remove_last_columns(self):
+        self.write_file([["a", "b", "c"], ["1", "2", "3"]])
+        table = lazytables.file_open(self.file_name)
+        self.assertIsInstance(table, lazytables.LazyTable)
+        table.remove_column(3)
+        tables.file_save(table, self.file_name)
+        self.assertEqual(read_rows(self.file_name), [["a", "b"], ["1", "2"]])
+
+        table = lazytables.file_open(self.file_name)
+        table.remove_column(2)
+        table.remove_column(1)
+        table.insert_column(0)
+        tables.file_save(table, self.file_name)
+        self.assertEqual(read_rows(self.file_name), [[""], [""]])
+
+    def test_save_edits(self):
+        # Line breaks of two characters are kept as well
+        self.write_file(make_rows(500), "\r\n")
+
+        def change(table):
+            table.set_cell(1, 1, "first")
+            table.set_cell(2, 70, 'a "quoted" value')
+            table.set_cell(3, 300, "more\nlines")
+            table.set_cell(4, 500, None)
+            table.insert_row(100)
+            table.set_cell(1, 101, "inserted")
+            table.insert_row(table.row_count)
+            table.remove_row(200)
+            table.remove_row(2)
+
+        self.assert_saved_alike(change)
+
+    def test_save_sorted(self):
+        self.write_file(make_rows(500), "\r\n")
+
+        def change(table):
+            table.sort_rows(2, descending=True)
+            table.set_cell(1, 10, "edited")
+            table.remove_row(400)
+            table.insert_row(0)
+            table.permute_rows(list(range(table.row_count))[::-1])
+
+        self.assert_saved_alike(change)
+
+    def test_save_columns(self):
+        self.write_file(make_rows(500))
+
+        def change(table):
+            table.set_cell(2, 3, "edited")
+            table.remove_column(1)
+            # The removed column is put back at the end
+            table.insert_column(table.column_count, table.remove_column(2))
+            table.insert_column(1)
+            table.set_cell(2, 5, "new")
+
+        self.assert_saved_alike(change)
+
+    def test_line_breaks(self):
+        # Edited rows end with the line breaks of the rows that are copied
+        self.write_file([["a", "b"], ["1", "2"], ["3", "4"]])
+        table = lazytables.file_open(self.file_name)
+        table.set_cell(2, 2, "x")
+        table.insert_row(table.row_count)
+        tables.file_save(table, self.file_name)
+        with open(self.file_name, "rb") as file:
+            self.assertEqual(file.read(), b"a,b\n1,x\n3,4\n,\n")
+
+    def test_unquoted_rows(self):
+        # Quotes in files without quoted values do not join lines into rows
+        with open(self.file_name, "w", encoding="utf-8", newline="") as file:
+            file.write('a,b"\nc"d,e\nf,g\n')
+        dialect = csv.excel()
+        dialect.quoting = csv.QUOTE_NONE
+        table = lazytables.LazyTable(self.file_name, dialect)
+        while table.index_chunk():
+            pass
+        self.assertEqual(table.get_rows(1, table.row_count + 1),
+                         [["a", 'b"'], ['c"d', "e"], ["f", "g"]])
+
+    def test_escaped_quotes(self):
+        # Escaped quotes can not be counted, so the whole file is loaded
+        with open(self.file_name, "w", encoding="utf-8", newline="") as file:
+            file.write('a,b\\"c\nd\\\ne,f\n')
+        table = lazytables.file_open(self.file_name)
+        self.assertNotIsInstance(table, lazytables.LazyTable)
+        self.assertEqual(table.get_rows(1, table.row_count + 1), [("a", 'b"c'), ("d\ne", "f")])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+"""
+This module is a part of CSVEdit.
+It contains checks of sniffing the dialects of csv files, run them from the folder
+of the editor with: python -m unittest discover test
+"""
+import os
+import csv
+import tempfile
+import unittest
+
+import tables
+import csvgen
+
+class SniffTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.directory.name, "table.csv")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_text(self, text: str):
+        """Writes the text of the file the tests open"""
+        with open(self.file_name, "w", encoding="utf-8", newline="") as file:
+            file.write(text)
+
+    def test_backslashes_in_values(self):
+        # Backslashes before delimiters and line breaks are a part of the values
+        self.write_text("name,path,size\na,C:\\Temp\\,10\nb,D:\\x\\,20")
+        table = tables.file_open(self.file_name)
+        self.assertIsNone(table.dialect.escapechar)
+        self.assertEqual(table.get_rows(2, 4), [("a", "C:\\Temp\\", "10"), ("b", "D:\\x\\", "20")])
+
+    def test_escaped_quotes(self):
+        # Files written by csvgen without quoting escape quotes, delimiters and line breaks
+        csvgen.generate_file(self.file_name, 7, 100, kinds=csvgen.default_kinds, quoting=csv.QUOTE_NONE)
+        table = tables.file_open(self.file_name)
+        self.assertEqual(table.dialect.escapechar, "\\")
+        with open(self.file_name, encoding="utf-8", newline="") as file:
+            rows = list(csv.reader(file, quoting=csv.QUOTE_NONE, escapechar="\\"))
+        self.assertEqual(table.get_rows(1, table.row_count + 1), [tuple(row) for row in rows])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+"""
+This module is a part of CSVEdit.
+It contains checks of the summaries of table columns, run them from the folder
+of the editor with: python -m unittest discover test
+"""
+import os
+import tempfile
+import unittest
+
+import tables
+import storage
+
+class SummaryTest(unittest.TestCase):
+    def test_large_numbers(self):
+        # The sum of the numbers is too large for a float
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "table.csv")
+            with open(file_name, "w", encoding="utf-8", newline="") as file:
+                file.write("1e308,x\n1e308,y\n")
+            table = tables.file_open(file_name)
+        self.assertEqual(table.get_aggregates(1), (2, float("inf"), 1e308, 1e308))
+        table.set_cell(1, 2, -1e308)
+        self.assertEqual(table.get_aggregates(1), (2, 0.0, -1e308, 1e308))
+
+    def test_exact_sum(self):
+        column = storage.Column()
+        column.extend(["-0.5", "0"])
+        self.assertEqual(column.summarize(), (2, -0.5, -0.5, 0.0))
+        column.set(1, 1e308)
+        column.set(1, None)
+        self.assertEqual(column.summarize(), (1, -0.5, -0.5, -0.5))
+
+    def test_count(self):
+        # Cells with empty text are not counted, whatever the column holds
+        table = tables.Table(2, 4)
+        for row, values in enumerate([("a", "1"), ("", ""), (None, None), ("b", "2")], 1):
+            for column, value in enumerate(values, 1):
+                table.set_cell(column, row, value)
+        self.assertEqual(table.get_aggregates(1), (2, None, None, None))
+        self.assertEqual(table.get_aggregates(2), (2, 3.0, 1.0, 2.0))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+"""
+This module is a part of CSVEdit.
+It contains a "RowView" class that shows only the rows of a table
+whose cells are equal to given values.
+"""
+import math
+from array import array
+from itertools import compress
+import tables
+import storage
+
+def matches(value, text: str):
+    """Returns True if a value is shown as a given text, None stands for an empty value"""
+    if text is None:
+        return value is None or value == ""
+    return value is not None and str(value) == text
+
+class RowView:
+    """
+    The rows of a table whose cells in some columns are equal to given values.
+    The view only keeps the numbers of its rows in the table, as a range
+    or an array, and reads their cells from the table, so it copies no values.
+    A view is filtered by one column more than the view it was made from,
+    which is kept as its parent, so filtering the same column by another
+    value starts from the parent instead of the whole table.
+    Cells changed through the view are listed in [edited], and their rows
+    are checked again when the view is filtered.
+    """
+    def __init__(self, table, rows=None, parent=None, column: int = None, value: str = None):
+        # Creates a view of given rows of a table, or of all of its rows
+        self.table = table
+        self.rows = range(1, table.row_count + 1) if rows is None else rows
+        self.parent = parent
+        self.column = column
+        self.value = value
+        self.conditions = dict(parent.conditions) if parent else {}
+        if column is not None:
+            self.conditions[column] = value
+        self.edited = parent.edited if parent else set()
+        self.dialect = table.dialect
+        self.row_count = len(self.rows)
+        self.column_count = table.column_count
+        # Aggregates of the columns of the view that were found
+        self.aggregates = {}
+
+    def get_cell(self, column, row: int):
+        """Returns the value stored in a cell of a row of the view"""
+        return self.table.get_cell(column, self.rows[row - 1])
+
+    def get_rows(self, start: int, stop: int):
+        """Returns the values of the rows of the view from [start] up to, but not including, [stop]"""
+        return [self.table.get_rows(row, row + 1)[0] for row in self.rows[start - 1:stop - 1]]
+
+    def get_aggregates(self, column):
+        """
+        Returns the count, the sum, the minimum and the maximum of the values
+        of a column in the rows of the view (see Table.get_aggregates)
+        """
+        if column in self.aggregates:
+            return self.aggregates[column]
+        values = []
+        for start in range(0, len(self.rows), tables.batch_size):
+            part = self.get_values(column, self.rows[start:start + tables.batch_size])
+            values.extend(value for value in part if value is not None and value != "")
+        try:
+            numbers = array('d', map(float, values))
+        except (ValueError, TypeError):
+            numbers = None
+        if numbers is None or not all(map(math.isfinite, numbers)):
+            result = (len(values), None, None, None)
+        else:
+            result = (len(numbers), storage.exact_sum(numbers), min(numbers, default=None), max(numbers, default=None))
+        self.aggregates[column] = result
+        return result
+
+    def edit(self, row: int):
+        """Marks a row whose cells were changed through the view"""
+        self.edited.add(row)
+        view = self
+        while view:
+            view.aggregates.clear()
+            view = view.parent
+
+    def get_search_index(self, column):
+        """Views are not indexed, their rows are read when they are searched"""
+        return None
+
+    def max_len(self, column):
+        """Returns the maximum length of the values of a column of the table"""
+        return self.table.max_len(column)
+
+    def get_values(self, column: int, rows):
+        """Returns the values of a column in given rows of the table"""
+        if isinstance(rows, range):
+            return self.table.get_column_values(column, rows.start, rows.stop)
+        if rows[-1] - rows[0] < 4 * len(rows):
+            # The rows are close to each other, so all the rows between them are read at once
+            values = self.table.get_column_values(column, rows[0], rows[-1] + 1)
+            return [values[row - rows[0]] for row in rows]
+        return [self.table.get_cell(column, row) for row in rows]
+
+    def narrow(self, column: int, value: str):
+        """Returns a view of the rows of the view whose cells in a column are equal to a value"""
+        rows = array('Q')
+        for start in range(0, len(self.rows), tables.batch_size):
+            part = self.rows[start:start + tables.batch_size]
+            values = self.get_values(column, part)
+            rows.extend(compress(part, [matches(cell, value) for cell in values]))
+        view = RowView(self.table, rows, self, column, value)
+        view.check_edited()
+        return view
+
+    def check_edited(self):
+        """Removes the edited rows that no longer match the filters of the view or of its parents"""
+        removed = {row for row in self.edited
+                   if not all(matches(self.table.get_cell(column, row), value)
+                              for column, value in self.conditions.items())}
+        if removed.intersection(self.rows):
+            self.rows = array('Q', (row for row in self.rows if row not in removed))
+            self.row_count = len(self.rows)
+
+    def filter(self, column: int, value: str):
+        """
+        Returns a view of the rows of the view whose cells in a column are equal to a value.
+        The view itself is returned when it is already filtered by it, and a column
+        that it is filtered by another value is filtered again from the view before it.
+        """
+        if column not in self.conditions:
+            return self.narrow(column, value)
+        if self.conditions[column] == value:
+            self.check_edited()
+            return self
+        # The filters made after the one of the column are applied again
+        later = []
+        view = self
+        while view.column != column:
+            later.append((view.column, view.value))
+            view = view.parent
+        view = view.parent.narrow(column, value)
+        for later_column, later_value in reversed(later):
+            view = view.narrow(later_column, later_value)
+        return view
@@ -25,6 +25,15 @@ KEY_C = Key('c', ord('c'))
 KEY_SC = Key('C', ord('C'))
 KEY_V = Key('v', ord('v'))
 KEY_SV = Key('V', ord('V'))
+KEY_U = Key('u', ord('u'))
+KEY_SU = Key('U', ord('U'))
+KEY_F = Key('f', ord('f'))
+KEY_N = Key('n', ord('n'))
+KEY_SN = Key('N', ord('N'))
+KEY_O = Key('o', ord('o'))
+KEY_SO = Key('O', ord('O'))
+KEY_W = Key('w', ord('w'))
+KEY_SW = Key('W', ord('W'))
 
 KEY_ESC = Key('Esc', 27)
 KEY_ENTER = Key('Enter', curses.KEY_ENTER, 13, 10)
@@ -77,6 +86,7 @@ class Info:
     - text of the default mesasge
     - current mode of the editor
     - alert symbol
+    - aggregates of the current column
     """
     def __init__(self, default_message: str = None):
         self.default_message = default_message
@@ -84,6 +94,7 @@ class Info:
         self.mode = 'R'
         self.show_mode = True
         self.alert = None
+        self.aggregates = ""
 
     def set_alert(self, alert_sign: str, new_message: str):
         """Sets the alert symbol message."""
@@ -102,7 +113,43 @@ class Info:
         self.message = new_message
         self.show_mode = show_mode
 
+    def set_aggregates(self, aggregates):
+        """Sets the aggregates shown next to the default message from a count, a sum, a minimum and a maximum"""
+        if aggregates is None:
+            self.aggregates = ""
+            return
+        count, total, minimum, maximum = aggregates
+        if total is None or not count:
+            self.aggregates = f"count: {count}"
+            return
+        self.aggregates = (f"sum: {total:.12g}  mean: {total / count:.12g}  "
+                           f"min: {minimum:.12g}  max: {maximum:.12g}  count: {count}")
+
     def reset_messsage(self):
         """Resets the message the default value."""
         self.message = self.default_message
         self.show_mode = True
+
+class Damage:
+    """
+    A class that keeps track of the parts of the interface
+    that have changed since they were last drawn:
+    - panels (table, column and row bars, info line, etc.)
+    - single cells of the table
+    """
+    def __init__(self):
+        self.panels = set()
+        self.cells = set()
+
+    def add_panels(self, *panels: str):
+        """Marks panels to be redrawn."""
+        self.panels.update(panels)
+
+    def add_cell(self, column_number: int, row: int):
+        """Marks a cell of the table to be redrawn."""
+        self.cells.add((column_number, row))
+
+    def clear(self):
+        """Marks everything as drawn."""
+        self.panels.clear()
+        self.cells.clear()